@@ -0,0 +1,110 @@
+"""
+Event loop stalls: blocking bulk operations against their async versions.
+
+A heartbeat task records the gaps between its turns on the event loop
+while each operation runs. A blocking call stalls the loop for its whole
+duration; the async versions yield between slices sized to --budget.
+
+Usage:
+    python -m benchmarks.bench_async [--size 200000] [--budget 0.001]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from py_treaps.treap_map import TreapMap
+
+
+async def measure(operation):
+    # Run operation alongside a heartbeat; return the total time and the
+    # longest and 99th percentile gaps between heartbeats, in seconds.
+    gaps = []
+    done = False
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    beat = asyncio.ensure_future(heartbeat())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await operation()
+    total = time.perf_counter() - start
+    done = True
+    await beat
+    gaps.sort()
+    return total, gaps[-1], gaps[int(len(gaps) * 0.99)]
+
+
+def make_cases(n, rng, budget):
+    a = [(k, k) for k in rng.sample(range(4 * n), n)]
+    b = [(k, -k) for k in rng.sample(range(4 * n), n)]
+
+    async def blocking(fn):
+        fn()
+
+    def meld_case(use_async):
+        t, other = TreapMap.from_items(a), TreapMap.from_items(b)
+        if use_async:
+            return lambda: t.ameld(other, budget=budget)
+        return lambda: blocking(lambda: t.meld(other))
+
+    def difference_case(use_async):
+        t, other = TreapMap.from_items(a), TreapMap.from_items(b)
+        if use_async:
+            return lambda: t.adifference(other, budget=budget)
+        return lambda: blocking(lambda: t.difference(other))
+
+    def load_case(use_async):
+        t = TreapMap()
+        if use_async:
+            return lambda: t.aload(a, budget=budget)
+        return lambda: blocking(lambda: t.insert_many(*zip(*a)))
+
+    def iterate_case(use_async):
+        t = TreapMap.from_items(a)
+
+        async def consume():
+            async for _ in t.aitems(budget=budget):
+                pass
+
+        if use_async:
+            return consume
+        return lambda: blocking(lambda: list(t.items()))
+
+    return {
+        "meld": meld_case,
+        "difference": difference_case,
+        "load": load_case,
+        "iterate": iterate_case,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--budget", type=float, default=0.001)
+    args = parser.parse_args()
+
+    cases = make_cases(args.size, random.Random(1), args.budget)
+    print(
+        f"{'op':>10} {'blocking s':>11} {'max stall ms':>13} {'async s':>8} "
+        f"{'max stall ms':>13} {'p99 stall ms':>13}"
+    )
+    for name, case in cases.items():
+        total, stall, _ = asyncio.run(measure(case(False)))
+        async_total, async_stall, p99 = asyncio.run(measure(case(True)))
+        print(
+            f"{name:>10} {total:>11.3f} {stall * 1e3:>13.1f} {async_total:>8.3f} "
+            f"{async_stall * 1e3:>13.2f} {p99 * 1e3:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
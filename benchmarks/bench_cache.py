@@ -0,0 +1,82 @@
+"""
+Expiry cost: TreapCache.expire against a full scan of a TreapMap.
+
+The baseline stores (value, deadline) in a TreapMap and expires entries
+the hand-rolled way, scanning every key for deadlines in the past. Both
+caches hold --size entries with deadlines spread uniformly over --span
+seconds; each round advances the clock so that about --fraction of the
+entries expire, and refills them.
+
+Usage:
+    python -m benchmarks.bench_cache [--size 100000] [--fraction 0.01]
+"""
+
+import argparse
+import random
+import time
+
+from py_treaps.treap_cache import TreapCache
+from py_treaps.treap_map import TreapMap
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def scan_expire(treap, now):
+    expired = [key for key, (_, deadline) in treap.items() if deadline <= now]
+    for key in expired:
+        treap.remove(key)
+    return len(expired)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--fraction", type=float, default=0.01)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--span", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    ttls = [rng.uniform(0, args.span) for _ in range(args.size)]
+    step = args.span * args.fraction
+
+    clock = Clock()
+    cache = TreapCache(clock=clock)
+    scanned = TreapMap()
+    for key, ttl in enumerate(ttls):
+        cache.put(key, key, ttl=ttl)
+        scanned.insert(key, (key, ttl))
+
+    scan_time = split_time = 0.0
+    next_key = args.size
+    for _ in range(args.rounds):
+        clock.now += step
+        start = time.perf_counter()
+        dropped = scan_expire(scanned, clock.now)
+        scan_time += time.perf_counter() - start
+        start = time.perf_counter()
+        assert cache.expire() == dropped
+        split_time += time.perf_counter() - start
+        for _ in range(dropped):
+            deadline = clock.now + args.span
+            scanned.insert(next_key, (next_key, deadline))
+            cache.put(next_key, next_key, ttl=args.span)
+            next_key += 1
+
+    print(f"{'entries':>9} {'expired/round':>14} {'scan ms':>9} {'split ms':>9} {'speedup':>8}")
+    scan_ms = scan_time / args.rounds * 1e3
+    split_ms = split_time / args.rounds * 1e3
+    print(
+        f"{args.size:>9} {int(args.size * args.fraction):>14} {scan_ms:>9.2f} "
+        f"{split_ms:>9.2f} {scan_ms / split_ms:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
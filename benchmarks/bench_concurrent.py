@@ -0,0 +1,89 @@
+"""
+Multi-threaded throughput: ConcurrentTreapMap and ShardedTreapMap against
+a coarse lock.
+
+Each thread runs a mix of lookups and inserts on a shared map. The
+baseline wraps every TreapMap call in one global lock, so readers
+serialize with each other and with writers.
+
+Usage:
+    python -m benchmarks.bench_concurrent [--threads 1 2 4 8] [--write-ratio 0.05]
+        [--shards 16]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from py_treaps.concurrent_treap_map import ConcurrentTreapMap
+from py_treaps.sharded_treap_map import ShardedTreapMap
+from py_treaps.treap_map import TreapMap
+
+
+class CoarseLockTreapMap:
+    def __init__(self, items):
+        self._treap = TreapMap.from_items(items)
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        with self._lock:
+            return self._treap.lookup(key)
+
+    def insert(self, key, value):
+        with self._lock:
+            self._treap.insert(key, value)
+
+
+def run(treap, threads, ops_per_thread, write_ratio, key_space):
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        lookup, insert = treap.lookup, treap.insert
+        barrier.wait()
+        for _ in range(ops_per_thread):
+            key = rng.randrange(key_space)
+            if rng.random() < write_ratio:
+                insert(key, key)
+            else:
+                lookup(key)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return threads * ops_per_thread / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=50000, help="operations per thread")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+
+    items = [(k, k) for k in range(0, 2 * args.size, 2)]
+    print(
+        f"{'threads':>7} {'coarse lock ops/s':>18} {'concurrent ops/s':>17} "
+        f"{'sharded ops/s':>14}"
+    )
+    for threads in args.threads:
+        coarse, concurrent, sharded = (
+            run(treap, threads, args.ops, args.write_ratio, 2 * args.size)
+            for treap in (
+                CoarseLockTreapMap(items),
+                ConcurrentTreapMap.from_items(items),
+                ShardedTreapMap.from_items(items, args.shards),
+            )
+        )
+        print(f"{threads:>7} {coarse:>18,.0f} {concurrent:>17,.0f} {sharded:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
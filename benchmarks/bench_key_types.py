@@ -0,0 +1,121 @@
+"""
+Per-key-type cost of lookup, insert and remove.
+
+For each key type the searches are timed three ways:
+
+    early exit  every search tests == and then < at each level (the loop
+                TreapMap used for every key type before)
+    TreapMap    the current dispatch: early exit for int, float, str and
+                bytes; one < per level with a final equality test otherwise
+    keyed       KeyedTreapMap with a key function returning a cached int
+                tuple (dataclass keys only)
+
+Usage:
+    python -m benchmarks.bench_key_types [--size 100000] [--ops 50000] [--repeat 3]
+        [--types int float str bytes tuple dataclass]
+"""
+
+import argparse
+import gc
+import random
+import time
+from dataclasses import dataclass
+from operator import attrgetter
+
+from py_treaps.keyed_treap_map import KeyedTreapMap
+from py_treaps.treap_map import TreapMap
+
+
+class Everything:
+    def __contains__(self, item):
+        return True
+
+
+class EarlyExitTreapMap(TreapMap):
+    # Treat every key type as native, which restores the early-exit loops.
+    _native_key_types = Everything()
+
+
+@dataclass(frozen=True, order=True)
+class Point:
+    x: int
+    y: int
+
+
+KEY_TYPES = {
+    "int": lambda k: k,
+    "float": lambda k: k / 7,
+    "str": lambda k: f"{k * 2654435761 % (1 << 32):08x}",
+    "bytes": lambda k: f"{k * 2654435761 % (1 << 32):08x}".encode(),
+    "tuple": lambda k: (k % 1000, k),
+    "dataclass": lambda k: Point(k % 1000, k),
+}
+
+
+def time_ops(make, keys, probes, fresh):
+    # Seconds per lookup, insert and remove on a treap built from keys.
+    treap = make(keys)
+    gc.collect()
+    start = time.perf_counter()
+    for key in probes:
+        treap.lookup(key)
+    lookup = (time.perf_counter() - start) / len(probes)
+    start = time.perf_counter()
+    for key in fresh:
+        treap.insert(key, None)
+    insert = (time.perf_counter() - start) / len(fresh)
+    start = time.perf_counter()
+    for key in fresh:
+        treap.remove(key)
+    remove = (time.perf_counter() - start) / len(fresh)
+    return lookup, insert, remove
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--ops", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--types", nargs="+", default=list(KEY_TYPES), choices=list(KEY_TYPES))
+    args = parser.parse_args()
+
+    print(
+        f"{'keys':>9} {'op':>7} {'early exit ns':>14} {'TreapMap ns':>12} {'speedup':>8}"
+        f" {'keyed ns':>9} {'speedup':>8}"
+    )
+    for name in args.types:
+        rng = random.Random(1)
+        raw = rng.sample(range(8 * args.size), args.size + args.ops)
+        convert = KEY_TYPES[name]
+        keys = [convert(k) for k in raw[: args.size]]
+        fresh = [convert(k) for k in raw[args.size :]]
+        probes = [rng.choice(keys) for _ in range(args.ops)]
+
+        def build(cls):
+            return lambda keys: cls.from_items((k, None) for k in keys)
+
+        makers = [build(EarlyExitTreapMap), build(TreapMap)]
+        if name == "dataclass":
+            key = attrgetter("x", "y")
+            makers.append(lambda keys: KeyedTreapMap.from_items(((k, None) for k in keys), key))
+        # Interleave the variants and keep the best of --repeat runs.
+        best = [[float("inf")] * 3 for _ in makers]
+        for _ in range(args.repeat):
+            for times, make in zip(best, makers):
+                times[:] = map(min, times, time_ops(make, keys, probes, fresh))
+        old, new = best[0], best[1]
+        keyed = best[2] if len(best) > 2 else None
+        for i, op in enumerate(("lookup", "insert", "remove")):
+            line = (
+                f"{name:>9} {op:>7} {old[i] * 1e9:>14.0f} {new[i] * 1e9:>12.0f} "
+                f"{old[i] / new[i]:>7.2f}x"
+            )
+            if keyed is not None:
+                line += f" {keyed[i] * 1e9:>9.0f} {old[i] / keyed[i]:>7.2f}x"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
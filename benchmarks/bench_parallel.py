@@ -0,0 +1,46 @@
+"""
+Compare serial TreapMap.from_items against the sharded process-pool build.
+
+Usage:
+    python -m benchmarks.bench_parallel [--sizes 100000 1000000] [--workers 8]
+"""
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from py_treaps.parallel import parallel_from_items
+from py_treaps.treap_map import TreapMap
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"{'n':>10} {'workers':>8} {'serial s':>9} {'sharded s':>10} {'speedup':>8}")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Warm the pool so process start-up is not timed.
+        list(pool.map(abs, range(args.workers)))
+        for n in args.sizes:
+            rng = random.Random(n)
+            items = [(rng.random(), i) for i in range(n)]
+            serial = timed(TreapMap.from_items, items)
+            sharded = timed(parallel_from_items, items, args.workers, executor=pool)
+            print(
+                f"{n:>10} {args.workers:>8} {serial:>9.3f} {sharded:>10.3f} "
+                f"{serial / sharded:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare the split/merge set algorithms against per-key meld/difference.
+
+Usage:
+    python -m benchmarks.bench_set_ops [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import random
+import time
+
+from py_treaps.treap_map import TreapMap
+
+
+def per_key_meld(treap, other):
+    for key in other:
+        treap.insert(key, other.lookup(key))
+
+
+def per_key_difference(treap, other):
+    for key in other:
+        treap.remove(key)
+
+
+def build(n, m, rng):
+    keys = rng.sample(range(4 * n), n + m)
+    a = TreapMap.from_items((k, k) for k in keys[:n])
+    b = TreapMap.from_items((k, k) for k in keys[n // 2 : n // 2 + m])
+    return a, b
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ratio", type=float, default=1.0, help="m / n")
+    args = parser.parse_args()
+
+    print(f"{'n':>9} {'m':>9} {'op':>11} {'per-key s':>10} {'split/merge s':>14} {'speedup':>8}")
+    for n in args.sizes:
+        m = max(1, int(n * args.ratio))
+        for op, old, new in (
+            ("meld", per_key_meld, TreapMap.meld),
+            ("difference", per_key_difference, TreapMap.difference),
+        ):
+            a, b = build(n, m, random.Random(n))
+            old_time = timed(old, a, b)
+            a, b = build(n, m, random.Random(n))
+            new_time = timed(new, a, b)
+            print(
+                f"{n:>9} {m:>9} {op:>11} {old_time:>10.4f} {new_time:>14.4f} "
+                f"{old_time / new_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
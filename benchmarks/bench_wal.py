@@ -0,0 +1,97 @@
+"""
+Write-ahead log costs: commit policy throughput and replay speed.
+
+Writer threads insert --size keys into a DurableTreapMap in total,
+either committing after every insert (one fsync per write, unless
+concurrent commits share one) or leaving commits to the background
+group committer. Replay then rebuilds the final state from the log,
+once in batches and once applying each record in turn.
+
+Usage:
+    python -m benchmarks.bench_wal [--size 20000] [--threads 4]
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from py_treaps.treap_map import TreapMap
+from py_treaps.wal import INSERT, DurableTreapMap, read_log, replay
+
+
+def write(directory, keys, threads, per_write_commit):
+    wal = DurableTreapMap(directory, commit_interval=0.005, compact_bytes=None)
+    share = len(keys) // threads
+
+    def run(part):
+        for key in part:
+            wal.insert(key, key)
+            if per_write_commit:
+                wal.commit()
+
+    workers = [
+        threading.Thread(target=run, args=(keys[i * share : (i + 1) * share],))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wal.commit()
+    elapsed = time.perf_counter() - start
+    wal.close()
+    return elapsed
+
+
+def sequential_replay(operations):
+    treap = TreapMap()
+    for operation in operations:
+        if operation[0] == INSERT:
+            treap.insert(operation[1], operation[2])
+        else:
+            treap.remove(operation[1])
+    return treap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    keys = random.Random(1).sample(range(10 * args.size), args.size)
+    print(f"{'commit policy':>15} {'writes/s':>10}")
+    for name, per_write in (("every write", True), ("group", False)):
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed = write(directory, keys, args.threads, per_write)
+        print(f"{name:>15} {args.size / elapsed:>10.0f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        wal = DurableTreapMap(directory, commit_interval=None, compact_bytes=None)
+        rng = random.Random(2)
+        for key in keys:
+            wal.insert(key, key)
+            if rng.random() < 0.2:
+                wal.remove(rng.choice(keys))
+        wal.close()
+        operations = read_log(f"{directory}/log-00000000.wal")[0]
+
+    start = time.perf_counter()
+    batched = replay(TreapMap(), operations)
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    single = sequential_replay(operations)
+    single_time = time.perf_counter() - start
+    assert list(batched.items()) == list(single.items())
+    print(f"\n{'records':>9} {'per-record s':>13} {'batched s':>10} {'speedup':>8}")
+    print(
+        f"{len(operations):>9} {single_time:>13.3f} {batch_time:>10.3f} "
+        f"{single_time / batch_time:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
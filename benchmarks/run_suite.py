@@ -0,0 +1,208 @@
+"""
+Benchmark suite for every TreapMap operation, with baseline comparison.
+
+Each operation is timed at every size and key distribution, and reported
+as seconds per operation (per key for lookup/insert/remove, per element
+for iteration, per call otherwise), the best of --repeat runs. Results
+are written as JSON; given a baseline file from an earlier run, any
+result slower than the baseline by more than --threshold is flagged and
+the exit status is 1.
+
+Distributions:
+    sorted  integer keys, new keys arrive in ascending order above the maximum
+    random  integer keys in random order
+    string  random 16-character hex string keys
+
+Usage:
+    python -m benchmarks.run_suite [--sizes 1000 10000 100000]
+        [--distributions sorted random string] [--ops lookup insert ...]
+        [--output results.json] [--baseline baseline.json] [--threshold 1.25]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+
+from py_treaps.treap_map import TreapMap
+
+# Keys per batch for the per-key operations, and calls for the O(log n) ones.
+BATCH = 10000
+CALLS = 1000
+
+
+def make_keys(distribution, n, m, rng):
+    # n keys for the treap and m further keys not in it.
+    if distribution == "sorted":
+        return list(range(n)), list(range(n, n + m))
+    keys = rng.sample(range(8 * (n + m)), n + m)
+    if distribution == "string":
+        keys = [f"{k * 0x9E3779B97F4A7C15 % (1 << 64):016x}" for k in keys]
+    return keys[:n], keys[n:]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_lookup(treap, present, absent, rng):
+    probes = [rng.choice(present) for _ in range(BATCH)]
+    lookup = treap.lookup
+    return timed(lambda: [lookup(k) for k in probes]) / BATCH
+
+
+def bench_insert(treap, present, absent, rng):
+    insert = treap.insert
+    return timed(lambda: [insert(k, k) for k in absent]) / len(absent)
+
+
+def bench_remove(treap, present, absent, rng):
+    victims = rng.sample(present, min(BATCH, len(present)))
+    remove = treap.remove
+    return timed(lambda: [remove(k) for k in victims]) / len(victims)
+
+
+def bench_split(treap, present, absent, rng):
+    # Alternate split with join to restore the treap between calls.
+    thresholds = [rng.choice(present) for _ in range(CALLS)]
+    total = 0.0
+    for threshold in thresholds:
+        start = time.perf_counter()
+        left, right = treap.split(threshold)
+        total += time.perf_counter() - start
+        left.join(right)
+        treap = left
+    return total / CALLS
+
+
+def bench_join(treap, present, absent, rng):
+    thresholds = [rng.choice(present) for _ in range(CALLS)]
+    total = 0.0
+    for threshold in thresholds:
+        left, right = treap.split(threshold)
+        start = time.perf_counter()
+        left.join(right)
+        total += time.perf_counter() - start
+        treap = left
+    return total / CALLS
+
+
+def bench_meld(treap, present, absent, rng):
+    other = TreapMap.from_items((k, k) for k in absent)
+    return timed(lambda: treap.meld(other))
+
+
+def bench_difference(treap, present, absent, rng):
+    other = TreapMap.from_items((k, k) for k in rng.sample(present, len(absent)))
+    return timed(lambda: treap.difference(other))
+
+
+def bench_iteration(treap, present, absent, rng):
+    return timed(lambda: list(treap.items())) / len(present)
+
+
+def bench_balance_factor(treap, present, absent, rng):
+    return timed(treap.balance_factor)
+
+
+def bench_balance_factor_approx(treap, present, absent, rng):
+    return timed(lambda: treap.balance_factor(approx=True))
+
+
+OPERATIONS = {
+    "lookup": bench_lookup,
+    "insert": bench_insert,
+    "remove": bench_remove,
+    "split": bench_split,
+    "join": bench_join,
+    "meld": bench_meld,
+    "difference": bench_difference,
+    "iteration": bench_iteration,
+    "balance_factor": bench_balance_factor,
+    "balance_factor_approx": bench_balance_factor_approx,
+}
+
+
+def run(sizes, distributions, ops, repeat):
+    results = []
+    for distribution in distributions:
+        for n in sizes:
+            m = min(n, BATCH)
+            present, absent = make_keys(distribution, n, m, random.Random(n))
+            for op in ops:
+                best = float("inf")
+                for r in range(repeat):
+                    # Every run gets a fresh treap, built outside the timing.
+                    treap = TreapMap.from_items((k, k) for k in present)
+                    gc.collect()
+                    best = min(best, OPERATIONS[op](treap, present, absent, random.Random(r)))
+                results.append(
+                    {"op": op, "distribution": distribution, "n": n, "seconds_per_op": best}
+                )
+                print(f"{op:>21} {distribution:>7} {n:>10} {best * 1e6:>12.3f} us", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Return the results slower than their baseline entry by more than
+    # threshold, as (result, ratio) pairs.
+    previous = {(b["op"], b["distribution"], b["n"]): b["seconds_per_op"] for b in baseline}
+    slower = []
+    for result in results:
+        old = previous.get((result["op"], result["distribution"], result["n"]))
+        if old and result["seconds_per_op"] / old > threshold:
+            slower.append((result, result["seconds_per_op"] / old))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--distributions", nargs="+", default=["sorted", "random", "string"],
+        choices=["sorted", "random", "string"],
+    )
+    parser.add_argument("--ops", nargs="+", default=list(OPERATIONS), choices=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=1.25,
+        help="flag results slower than baseline by more than this ratio",
+    )
+    args = parser.parse_args()
+
+    print(f"{'op':>21} {'keys':>7} {'n':>10} {'time per op':>15}")
+    results = run(args.sizes, args.distributions, args.ops, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.threshold)
+        for result, ratio in slower:
+            print(
+                f"SLOWER {result['op']} {result['distribution']} n={result['n']}: "
+                f"{ratio:.2f}x baseline"
+            )
+        if slower:
+            sys.exit(1)
+        print(f"no result slower than baseline by more than {args.threshold}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,525 @@
+from __future__ import annotations
+import math
+from array import array
+from collections.abc import Iterable, Iterator
+from operator import itemgetter
+from typing import Any, List, Optional, Tuple
+
+from py_treaps.priority import PrioritySource, default_priority_source
+from py_treaps.treap import KT, VT, Treap
+from py_treaps.treap_node import TreapNode
+
+# Handle used for "no node" in the link columns.
+NIL = -1
+
+
+class NodeArena:
+    """Struct-of-arrays storage for treap nodes.
+
+    A node is an int handle indexing parallel columns: keys and values
+    live in lists, while priorities and the parent/child links live in
+    packed 64-bit arrays. Handles freed by `release` are reused by later
+    allocations. Several ArenaTreapMaps may share one arena, which is what
+    lets `split` and `join` run without copying; each handle belongs to
+    exactly one of them, which releases it when it is removed, cleared or
+    garbage collected.
+    """
+
+    def __init__(self) -> None:
+        self.keys: List[Any] = []
+        self.values: List[Any] = []
+        self.priority = array("Q")
+        self.parent = array("q")
+        self.left = array("q")
+        self.right = array("q")
+        self.free: List[int] = []
+
+    def allocate(self, key: Any, value: Any, priority: int, parent: int = NIL) -> int:
+        if self.free:
+            handle = self.free.pop()
+            self.keys[handle] = key
+            self.values[handle] = value
+            self.priority[handle] = priority
+            self.parent[handle] = parent
+            self.left[handle] = NIL
+            self.right[handle] = NIL
+            return handle
+        self.keys.append(key)
+        self.values.append(value)
+        self.priority.append(priority)
+        self.parent.append(parent)
+        self.left.append(NIL)
+        self.right.append(NIL)
+        return len(self.keys) - 1
+
+    def release(self, handle: int) -> None:
+        # Drop references so freed slots don't keep keys and values alive.
+        self.keys[handle] = None
+        self.values[handle] = None
+        self.free.append(handle)
+
+
+class ArenaTreapMap(Treap[KT, VT]):
+    """A TreapMap whose nodes live in a shared NodeArena.
+
+    This trades `TreapNode` objects for int handles into packed columns,
+    which roughly halves the per-entry overhead. `get_root_node` is not
+    supported since there are no node objects to return.
+
+    The halves made by `split` share the arena. When one of them is
+    dropped, its handles are released for reuse, in O(size of the half);
+    `clear` does the same explicitly.
+    """
+
+    def __init__(
+        self,
+        arena: Optional[NodeArena] = None,
+        priorities: Optional[PrioritySource] = None,
+    ):
+        self.arena = arena if arena is not None else NodeArena()
+        self.root: int = NIL
+        self.priorities: PrioritySource = (
+            default_priority_source if priorities is None else priorities
+        )
+
+    @classmethod
+    def from_sorted(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        priorities: Optional[PrioritySource] = None,
+    ) -> ArenaTreapMap[KT, VT]:
+        treap = cls(None, priorities)
+        treap.root = treap._link_sorted(items)
+        return treap
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        priorities: Optional[PrioritySource] = None,
+    ) -> ArenaTreapMap[KT, VT]:
+        return cls.from_sorted(sorted(items, key=itemgetter(0)), priorities)
+
+    def _link_sorted(self, items: Iterable[Tuple[KT, VT]]) -> int:
+        # Allocate ascending pairs in this arena and link them with the
+        # O(n) stack build. Returns the root handle.
+        new_priority = self.priorities
+        arena = self.arena
+        priority, parent, left, right = arena.priority, arena.parent, arena.left, arena.right
+        stack: List[int] = []
+        for key, value in items:
+            if stack:
+                top = stack[-1]
+                if not arena.keys[top] < key:
+                    if key == arena.keys[top]:
+                        arena.values[top] = value
+                        continue
+                    raise ValueError("from_sorted requires keys in ascending order")
+
+            node = arena.allocate(key, value, new_priority(key))
+            last = NIL
+            while stack and priority[stack[-1]] < priority[node]:
+                last = stack.pop()
+            left[node] = last
+            if last != NIL:
+                parent[last] = node
+            if stack:
+                right[stack[-1]] = node
+                parent[node] = stack[-1]
+            stack.append(node)
+
+        return stack[0] if stack else NIL
+
+    def get_root_node(self) -> Optional[TreapNode]:
+        raise AttributeError("ArenaTreapMap stores no TreapNode objects")
+
+    def _find(self, key: KT) -> int:
+        keys, left, right = self.arena.keys, self.arena.left, self.arena.right
+        node = self.root
+        while node != NIL:
+            node_key = keys[node]
+            if key == node_key:
+                return node
+            node = left[node] if key < node_key else right[node]
+        return NIL
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        node = self._find(key)
+        return None if node == NIL else self.arena.values[node]
+
+    def _left_rotate(self, x: int) -> None:
+        parent, left, right = self.arena.parent, self.arena.left, self.arena.right
+        y = right[x]
+        right[x] = left[y]
+        if left[y] != NIL:
+            parent[left[y]] = x
+        parent[y] = parent[x]
+        if parent[x] == NIL:
+            self.root = y
+        elif x == left[parent[x]]:
+            left[parent[x]] = y
+        else:
+            right[parent[x]] = y
+        left[y] = x
+        parent[x] = y
+
+    def _right_rotate(self, y: int) -> None:
+        parent, left, right = self.arena.parent, self.arena.left, self.arena.right
+        x = left[y]
+        left[y] = right[x]
+        if right[x] != NIL:
+            parent[right[x]] = y
+        parent[x] = parent[y]
+        if parent[y] == NIL:
+            self.root = x
+        elif y == left[parent[y]]:
+            left[parent[y]] = x
+        else:
+            right[parent[y]] = x
+        right[x] = y
+        parent[y] = x
+
+    def insert(self, key: KT, value: VT) -> None:
+        arena = self.arena
+        keys, priority, parent_of = arena.keys, arena.priority, arena.parent
+        left, right = arena.left, arena.right
+
+        node = self.root
+        parent = NIL
+        while node != NIL and keys[node] != key:
+            parent = node
+            node = left[node] if key < keys[node] else right[node]
+
+        if node != NIL:
+            arena.values[node] = value
+            return
+
+        node = arena.allocate(key, value, self.priorities(key), parent)
+        if parent == NIL:
+            self.root = node
+        elif key < keys[parent]:
+            left[parent] = node
+        else:
+            right[parent] = node
+
+        # Maintain heap property
+        while parent != NIL and priority[node] > priority[parent]:
+            if left[parent] == node:
+                self._right_rotate(parent)
+            else:
+                self._left_rotate(parent)
+            parent = parent_of[node]
+
+    def remove(self, key: KT) -> Optional[VT]:
+        node = self._find(key)
+        if node == NIL:
+            return None
+
+        arena = self.arena
+        priority, parent, left, right = arena.priority, arena.parent, arena.left, arena.right
+        # Rotate node down until it is a leaf
+        while left[node] != NIL or right[node] != NIL:
+            if left[node] == NIL:
+                self._left_rotate(node)
+            elif right[node] == NIL:
+                self._right_rotate(node)
+            elif priority[left[node]] < priority[right[node]]:
+                # The child with the higher priority moves up.
+                self._left_rotate(node)
+            else:
+                self._right_rotate(node)
+
+        if parent[node] != NIL:
+            if node == left[parent[node]]:
+                left[parent[node]] = NIL
+            else:
+                right[parent[node]] = NIL
+        else:
+            self.root = NIL
+
+        value = arena.values[node]
+        arena.release(node)
+        return value
+
+    def split(self, threshold: KT) -> List[Treap[KT, VT]]:
+        # Same search-path split as TreapMap; both halves keep this arena.
+        arena = self.arena
+        keys, parent, left, right = arena.keys, arena.parent, arena.left, arena.right
+        left_root = right_root = NIL
+        left_tail = right_tail = NIL
+        node = self.root
+        while node != NIL:
+            if keys[node] < threshold:
+                if left_tail == NIL:
+                    left_root = node
+                else:
+                    right[left_tail] = node
+                parent[node] = left_tail
+                left_tail = node
+                node = right[node]
+            else:
+                if right_tail == NIL:
+                    right_root = node
+                else:
+                    left[right_tail] = node
+                parent[node] = right_tail
+                right_tail = node
+                node = left[node]
+
+        if left_tail != NIL:
+            right[left_tail] = NIL
+        if right_tail != NIL:
+            left[right_tail] = NIL
+
+        left_treap = ArenaTreapMap(arena, self.priorities)
+        right_treap = ArenaTreapMap(arena, self.priorities)
+        left_treap.root, right_treap.root = left_root, right_root
+        self.root = NIL
+        return [left_treap, right_treap]
+
+    def join(self, other: Treap[KT, VT]) -> None:
+        self.root = self._merge(self.root, self._take_root(other))
+
+    def _take_root(self, other: Treap[KT, VT]) -> int:
+        # Steal other's handles, leaving it empty. Handles can't be linked
+        # across arenas, so another arena's entries (or another Treap's)
+        # are first copied into this one.
+        if isinstance(other, ArenaTreapMap) and other.arena is self.arena:
+            root, other.root = other.root, NIL
+            return root
+        root = self._link_sorted((key, other.lookup(key)) for key in other)
+        if isinstance(other, ArenaTreapMap):
+            other.clear()
+        else:
+            for key in list(other):
+                other.remove(key)
+        return root
+
+    def _merge(self, a: int, b: int) -> int:
+        # Every key under a must be less than every key under b.
+        arena = self.arena
+        priority, parent, left, right = arena.priority, arena.parent, arena.left, arena.right
+        # Merge the right spine of a with the left spine of b by priority.
+        root = NIL
+        tail = NIL
+        tail_is_left = False
+        while a != NIL and b != NIL:
+            if priority[a] >= priority[b]:
+                node, a = a, right[a]
+                go_left = False
+            else:
+                node, b = b, left[b]
+                go_left = True
+            if tail == NIL:
+                root = node
+            elif tail_is_left:
+                left[tail] = node
+            else:
+                right[tail] = node
+            parent[node] = tail
+            tail, tail_is_left = node, go_left
+
+        rest = a if a != NIL else b
+        if tail == NIL:
+            root = rest
+        elif tail_is_left:
+            left[tail] = rest
+        else:
+            right[tail] = rest
+        if rest != NIL:
+            parent[rest] = tail
+        return root
+
+    def _split_at(self, node: int, key: KT) -> Tuple[int, int, int]:
+        # Split the subtree at node into the keys below key, the handle
+        # holding key (or NIL) and the keys above it.
+        arena = self.arena
+        keys, parent, left, right = arena.keys, arena.parent, arena.left, arena.right
+        left_root = right_root = NIL
+        left_tail = right_tail = NIL
+        equal = NIL
+        while node != NIL:
+            node_key = keys[node]
+            if node_key < key:
+                if left_tail == NIL:
+                    left_root = node
+                else:
+                    right[left_tail] = node
+                parent[node] = left_tail
+                left_tail = node
+                node = right[node]
+            elif key < node_key:
+                if right_tail == NIL:
+                    right_root = node
+                else:
+                    left[right_tail] = node
+                parent[node] = right_tail
+                right_tail = node
+                node = left[node]
+            else:
+                equal = node
+                break
+
+        below = left[equal] if equal != NIL else NIL
+        above = right[equal] if equal != NIL else NIL
+        if left_tail == NIL:
+            left_root = below
+        else:
+            right[left_tail] = below
+        if below != NIL:
+            parent[below] = left_tail
+        if right_tail == NIL:
+            right_root = above
+        else:
+            left[right_tail] = above
+        if above != NIL:
+            parent[above] = right_tail
+        return left_root, equal, right_root
+
+    def _union(self, a: int, b: int) -> int:
+        # Union of the subtrees at a (this treap's) and b; b's value wins
+        # for a shared key, and the losing handle is released.
+        arena = self.arena
+        keys, values, priority = arena.keys, arena.values, arena.priority
+        parent, left, right = arena.parent, arena.left, arena.right
+        split_at, release = self._split_at, arena.release
+
+        def union(a: int, b: int, swapped: bool) -> int:
+            # The higher-priority root stays on top and splits the other
+            # subtree by its key; swapped says whether a came from b's side.
+            if priority[a] < priority[b]:
+                a, b = b, a
+                swapped = not swapped
+            below, equal, above = split_at(b, keys[a])
+            if equal != NIL:
+                if not swapped:
+                    values[a] = values[equal]
+                release(equal)
+            node = left[a]
+            if below != NIL:
+                node = below if node == NIL else union(node, below, swapped)
+            left[a] = node
+            if node != NIL:
+                parent[node] = a
+            node = right[a]
+            if above != NIL:
+                node = above if node == NIL else union(node, above, swapped)
+            right[a] = node
+            if node != NIL:
+                parent[node] = a
+            return a
+
+        if a == NIL or b == NIL:
+            return a if b == NIL else b
+        return union(a, b, False)
+
+    def _difference(self, a: int, b: int) -> int:
+        # The subtree at a minus the keys under b, releasing every handle
+        # of b and each dropped handle of a. As in TreapMap._difference,
+        # a's roots split b without swapping on priority.
+        arena = self.arena
+        keys = arena.keys
+        parent, left, right = arena.parent, arena.left, arena.right
+        split_at, merge, release = self._split_at, self._merge, arena.release
+        release_tree = self._release_tree
+
+        def difference(a: int, b: int) -> int:
+            if a == NIL:
+                release_tree(b)
+                return NIL
+            if b == NIL:
+                return a
+            below, equal, above = split_at(b, keys[a])
+            lower = difference(left[a], below)
+            upper = difference(right[a], above)
+            if equal != NIL:
+                release(equal)
+                release(a)
+                return merge(lower, upper)
+            left[a], right[a] = lower, upper
+            if lower != NIL:
+                parent[lower] = a
+            if upper != NIL:
+                parent[upper] = a
+            return a
+
+        return difference(a, b)
+
+    def _set_root(self, root: int) -> None:
+        if root != NIL:
+            self.arena.parent[root] = NIL
+        self.root = root
+
+    def _release_tree(self, root: int) -> None:
+        arena = self.arena
+        left, right = arena.left, arena.right
+        stack = [root] if root != NIL else []
+        while stack:
+            node = stack.pop()
+            if left[node] != NIL:
+                stack.append(left[node])
+            if right[node] != NIL:
+                stack.append(right[node])
+            arena.release(node)
+
+    def clear(self) -> None:
+        """Remove every entry, releasing its handle to the arena."""
+        root, self.root = self.root, NIL
+        self._release_tree(root)
+
+    def __del__(self) -> None:
+        # A dropped map, such as an unused half of a split, would otherwise
+        # hold its slots in a shared arena for the arena's lifetime.
+        if self.root != NIL:
+            self.clear()
+
+    def meld(self, other: Treap[KT, VT]) -> None:
+        # Divide-and-conquer union over handles, as in TreapMap: O(m log(n/m
+        # + 1)) expected. other ends up empty; its value wins for shared keys.
+        self._set_root(self._union(self.root, self._take_root(other)))
+
+    def difference(self, other: Treap[KT, VT]) -> None:
+        # Divide-and-conquer difference over handles; other ends up empty.
+        self._set_root(self._difference(self.root, self._take_root(other)))
+
+    def balance_factor(self) -> float:
+        left, right = self.arena.left, self.arena.right
+        n = 0
+        height = 0
+        stack = [(self.root, 1)] if self.root != NIL else []
+        while stack:
+            node, depth = stack.pop()
+            n += 1
+            height = max(height, depth)
+            if left[node] != NIL:
+                stack.append((left[node], depth + 1))
+            if right[node] != NIL:
+                stack.append((right[node], depth + 1))
+        if n == 0:
+            return 1.0
+        return height / math.log2(n + 1)
+
+    def __str__(self) -> str:
+        arena = self.arena
+        lines = []
+        stack = [self.root] if self.root != NIL else []
+        while stack:
+            node = stack.pop()
+            lines.append(f"[{arena.priority[node]}] <{arena.keys[node]}, {arena.values[node]}>")
+            if arena.right[node] != NIL:
+                stack.append(arena.right[node])
+            if arena.left[node] != NIL:
+                stack.append(arena.left[node])
+        return "\n".join(lines)
+
+    def __iter__(self) -> Iterator[KT]:
+        keys, left, right = self.arena.keys, self.arena.left, self.arena.right
+        stack = []
+        node = self.root
+        while stack or node != NIL:
+            while node != NIL:
+                stack.append(node)
+                node = left[node]
+            node = stack.pop()
+            yield keys[node]
+            node = right[node]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Callable, Generic, List, Optional, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.persistent_treap_map import PersistentTreapMap
+from py_treaps.priority import PrioritySource
+
+
+class ConcurrentTreapMap(Generic[KT, VT], Iterable):
+    """A thread-safe TreapMap whose readers never block.
+
+    The map holds the current PersistentTreapMap version. Writers build
+    the next version under a lock and publish it with a single attribute
+    assignment, so a reader always sees one complete version: lookups and
+    iteration take no lock and are never held up by writers, and writers
+    only serialize against each other.
+    """
+
+    def __init__(self, priorities: Optional[PrioritySource] = None):
+        self._version: PersistentTreapMap[KT, VT] = PersistentTreapMap(priorities)
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        priorities: Optional[PrioritySource] = None,
+    ) -> ConcurrentTreapMap[KT, VT]:
+        treap = cls(priorities)
+        treap._version = PersistentTreapMap.from_items(items, priorities)
+        return treap
+
+    def snapshot(self) -> PersistentTreapMap[KT, VT]:
+        """Return the current version; later writes don't affect it."""
+        return self._version
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        return self._version.lookup(key)
+
+    def __contains__(self, key: KT) -> bool:
+        return key in self._version
+
+    def update(
+        self, fn: Callable[[PersistentTreapMap[KT, VT]], PersistentTreapMap[KT, VT]]
+    ) -> None:
+        """Atomically replace the current version with `fn(version)`.
+
+        Use this to apply several changes that readers should see at once.
+        """
+        with self._write_lock:
+            self._version = fn(self._version)
+
+    def insert(self, key: KT, value: VT) -> None:
+        with self._write_lock:
+            self._version = self._version.insert(key, value)
+
+    def remove(self, key: KT) -> Optional[VT]:
+        with self._write_lock:
+            version = self._version
+            value = version.lookup(key)
+            self._version = version.remove(key)
+        return value
+
+    def split(self, threshold: KT) -> List[ConcurrentTreapMap[KT, VT]]:
+        with self._write_lock:
+            version = self._version
+            self._version = PersistentTreapMap(version.priorities)
+        halves = []
+        for half in version.split(threshold):
+            treap = ConcurrentTreapMap(half.priorities)
+            treap._version = half
+            halves.append(treap)
+        return halves
+
+    def join(self, other: ConcurrentTreapMap[KT, VT]) -> None:
+        with other._write_lock:
+            other_version = other._version
+            other._version = PersistentTreapMap(other_version.priorities)
+        with self._write_lock:
+            self._version = self._version.join(other_version)
+
+    def __len__(self) -> int:
+        return len(self._version)
+
+    def items(self) -> Iterator[Tuple[KT, VT]]:
+        return self._version.items()
+
+    def __iter__(self) -> Iterator[KT]:
+        # Iterates the version current at the time of the call.
+        return iter(self._version)
@@ -0,0 +1,372 @@
+"""
+Opt-in operation statistics for TreapMap.
+
+`instrument(treap)` switches a treap (of any TreapMap subclass) to an
+instrumented subclass of its class that counts key comparisons,
+rotations, search path lengths and nodes created or freed, and records a
+latency histogram per operation in a shared `TreapStats`.
+`uninstrument(treap)` switches it back. Treaps that are not instrumented
+run the plain TreapMap code, so the statistics cost nothing when off.
+
+Comparisons are counted by searching with a wrapper around the search
+key, which the treap's keys meet as the right-hand operand. Key types
+must therefore return NotImplemented when compared with an unknown type,
+as the built-in types and dataclasses do.
+"""
+
+from __future__ import annotations
+from collections import Counter
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Type
+
+from py_treaps.comparable import KT, VT
+from py_treaps.treap_map import TreapMap
+from py_treaps.treap_node import TreapNode
+
+
+class LatencyHistogram:
+    """Operation latencies in power-of-two nanosecond buckets.
+
+    Attributes:
+        count: The number of recorded calls.
+        total_ns: Their summed latency.
+        buckets: Maps b to the number of calls that took [2**(b-1), 2**b) ns.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ns = 0
+        self.buckets: Counter = Counter()
+
+    def record(self, ns: int) -> None:
+        self.count += 1
+        self.total_ns += ns
+        self.buckets[ns.bit_length()] += 1
+
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def quantile_ns(self, q: float) -> int:
+        """Return an upper bound on the `q` quantile latency, within 2x."""
+        if not self.count:
+            return 0
+        target = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return 1 << bucket
+        return 1 << max(self.buckets)
+
+
+class TreapStats:
+    """Counters shared by the instrumented treaps that report to them.
+
+    Attributes:
+        comparisons: Key comparisons made against the keys being searched
+            for or added.
+        left_rotations: Calls to `_left_rotate`.
+        right_rotations: Calls to `_right_rotate`.
+        path_lengths: Maps a path length (nodes visited by one search of
+            lookup, insert, remove or split) to its number of searches.
+        nodes_created: Nodes allocated by inserts and bulk builds.
+        nodes_freed: Entries dropped by remove and the set operations.
+        latencies: Maps an operation name to its LatencyHistogram.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.comparisons = 0
+        self.left_rotations = 0
+        self.right_rotations = 0
+        self.path_lengths: Counter = Counter()
+        self.nodes_created = 0
+        self.nodes_freed = 0
+        self.latencies: Dict[str, LatencyHistogram] = {}
+
+    def mean_path_length(self) -> float:
+        searches = sum(self.path_lengths.values())
+        total = sum(length * n for length, n in self.path_lengths.items())
+        return total / searches if searches else 0.0
+
+    def record_latency(self, op: str, ns: int) -> None:
+        histogram = self.latencies.get(op)
+        if histogram is None:
+            histogram = self.latencies[op] = LatencyHistogram()
+        histogram.record(ns)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the statistics as plain data, e.g. for JSON export."""
+        return {
+            "comparisons": self.comparisons,
+            "left_rotations": self.left_rotations,
+            "right_rotations": self.right_rotations,
+            "mean_path_length": self.mean_path_length(),
+            "path_lengths": dict(self.path_lengths),
+            "nodes_created": self.nodes_created,
+            "nodes_freed": self.nodes_freed,
+            "latencies": {
+                op: {
+                    "count": h.count,
+                    "mean_ns": h.mean_ns(),
+                    "p50_ns": h.quantile_ns(0.5),
+                    "p99_ns": h.quantile_ns(0.99),
+                }
+                for op, h in self.latencies.items()
+            },
+        }
+
+
+class _CountedKey:
+    # Stands in for a search key, counting the comparisons made with it
+    # and the distinct keys (one per visited node) it is compared with.
+
+    __slots__ = ("key", "stats", "visits", "last")
+
+    def __init__(self, key: Any, stats: TreapStats) -> None:
+        self.key = key
+        self.stats = stats
+        self.visits = 0
+        self.last: Any = self
+
+    def _count(self, other: Any) -> None:
+        self.stats.comparisons += 1
+        if other is not self.last:
+            self.visits += 1
+            self.last = other
+
+    def __lt__(self, other: Any) -> bool:
+        self._count(other)
+        return self.key < other
+
+    def __gt__(self, other: Any) -> bool:
+        self._count(other)
+        return other < self.key
+
+    def __le__(self, other: Any) -> bool:
+        self._count(other)
+        return self.key <= other
+
+    def __ge__(self, other: Any) -> bool:
+        self._count(other)
+        return other <= self.key
+
+    def __eq__(self, other: Any) -> bool:
+        self._count(other)
+        return self.key == other
+
+    def __ne__(self, other: Any) -> bool:
+        self._count(other)
+        return self.key != other
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.key, name)
+
+
+class _CountedNativeKey(_CountedKey):
+    # Stands in for a key of a native type, so that the search takes the
+    # same loop as it would for the key itself.
+
+    __slots__ = ()
+
+
+def _timed(name: str) -> Callable[..., Any]:
+    # A method that times the next class's method of the same name.
+    def method(self: Any, *args: Any, **kwargs: Any) -> Any:
+        start = perf_counter_ns()
+        try:
+            return getattr(super(self._instrumented_class, self), name)(*args, **kwargs)
+        finally:
+            self.stats.record_latency(name, perf_counter_ns() - start)
+
+    method.__name__ = name
+    return method
+
+
+def _consuming(name: str) -> Callable[..., Any]:
+    # A timed set operation that also counts the entries it drops: every
+    # entry of both treaps that is not in the result.
+    def method(self: Any, other: Any, *args: Any, **kwargs: Any) -> Any:
+        before = len(self) + len(other)
+        start = perf_counter_ns()
+        try:
+            return getattr(super(self._instrumented_class, self), name)(
+                other, *args, **kwargs
+            )
+        finally:
+            self.stats.record_latency(name, perf_counter_ns() - start)
+            self.stats.nodes_freed += before - len(self) - len(other)
+
+    method.__name__ = name
+    return method
+
+
+def _make_instrumented(base: Type[TreapMap]) -> Type[TreapMap]:
+    # The instrumented class derives from base alone (no mixin), which
+    # keeps its layout identical so that instances can switch class.
+
+    class Instrumented(base):  # type: ignore[valid-type, misc]
+        stats: TreapStats
+
+        def __init__(self, *args: Any, stats: Optional[TreapStats] = None, **kwargs: Any):
+            super().__init__(*args, **kwargs)
+            self.stats = TreapStats() if stats is None else stats
+
+        _native_key_types = base._native_key_types | {_CountedNativeKey}
+
+        def _counted(self, key: Any) -> _CountedKey:
+            if type(key) in base._native_key_types:
+                return _CountedNativeKey(key, self.stats)
+            return _CountedKey(key, self.stats)
+
+        def _search(self, op: str, fn: Callable[[Any], Any], key: Any) -> Any:
+            # Run fn with a counted stand-in for key, recording one path.
+            counted = self._counted(key)
+            start = perf_counter_ns()
+            try:
+                return fn(counted)
+            finally:
+                self.stats.record_latency(op, perf_counter_ns() - start)
+                self.stats.path_lengths[counted.visits] += 1
+
+        def lookup(self, key: KT) -> Optional[VT]:
+            return self._search("lookup", super().lookup, key)
+
+        def remove(self, key: KT) -> Optional[VT]:
+            before = len(self)
+            value = self._search("remove", super().remove, key)
+            self.stats.nodes_freed += before - len(self)
+            return value
+
+        def split(self, threshold: KT) -> Any:
+            return self._search("split", super().split, threshold)
+
+        def _descend(
+            self, node: Optional[TreapNode], key: KT
+        ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
+            # The search of insert; the key it stores is the caller's own.
+            if isinstance(key, _CountedKey):
+                # Called from _finger_search, which counts the whole search.
+                return super()._descend(node, key)
+            counted = self._counted(key)
+            try:
+                return super()._descend(node, counted)
+            finally:
+                self.stats.path_lengths[counted.visits] += 1
+
+        def _finger_search(
+            self, hint: TreapNode, key: KT
+        ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
+            # The key is wrapped once for the climb and the descent below
+            # it, which together make one search path.
+            counted = self._counted(key)
+            try:
+                return super()._finger_search(hint, counted)
+            finally:
+                self.stats.path_lengths[counted.visits] += 1
+
+        def _split_at(self, node: Optional[TreapNode], key: KT) -> Any:
+            return super()._split_at(node, self._counted(key))
+
+        def append(self, key: KT, value: VT) -> TreapNode:
+            start = perf_counter_ns()
+            try:
+                if self.root is not None:
+                    # The check of key against the current maximum.
+                    self.stats.comparisons += 1
+                return super().append(key, value)
+            finally:
+                self.stats.record_latency("append", perf_counter_ns() - start)
+
+        def _left_rotate(self, x: TreapNode) -> None:
+            self.stats.left_rotations += 1
+            super()._left_rotate(x)
+
+        def _right_rotate(self, y: TreapNode) -> None:
+            self.stats.right_rotations += 1
+            super()._right_rotate(y)
+
+        def _add_leaf(self, parent: Optional[TreapNode], key: KT, value: VT) -> TreapNode:
+            # The new node takes the caller's key, so the comparison that
+            # picks its side of parent is counted here.
+            self.stats.nodes_created += 1
+            if parent is not None:
+                self.stats.comparisons += 1
+            return super()._add_leaf(parent, key, value)
+
+        def _sorted_nodes(self, items: Any) -> Iterator[TreapNode]:
+            for node in super()._sorted_nodes(items):
+                self.stats.nodes_created += 1
+                yield node
+
+        def _empty(self) -> Any:
+            # Pieces made by split and the set operations report here too.
+            return instrument(super()._empty(), self.stats)
+
+        insert = _timed("insert")
+        join = _timed("join")
+        lookup_many = _timed("lookup_many")
+        insert_many = _timed("insert_many")
+        meld = _consuming("meld")
+        intersection = _consuming("intersection")
+        difference = _consuming("difference")
+        symmetric_difference = _consuming("symmetric_difference")
+
+    Instrumented._instrumented_class = Instrumented
+    Instrumented._uninstrumented_class = base
+    Instrumented.__name__ = Instrumented.__qualname__ = "Instrumented" + base.__name__
+    return Instrumented
+
+
+_instrumented_classes: Dict[type, type] = {}
+
+
+def instrumented_class(cls: Type[TreapMap]) -> Type[TreapMap]:
+    """Return the instrumented subclass of the TreapMap class `cls`."""
+    if "_instrumented_class" in cls.__dict__:
+        return cls
+    instrumented = _instrumented_classes.get(cls)
+    if instrumented is None:
+        instrumented = _instrumented_classes[cls] = _make_instrumented(cls)
+    return instrumented
+
+
+def instrument(treap: TreapMap, stats: Optional[TreapStats] = None) -> TreapMap:
+    """Start collecting statistics for `treap`, in place.
+
+    Args:
+        treap: A TreapMap, or an instance of a TreapMap subclass.
+        stats: Where to record; by default the treap's current stats if it
+            is already instrumented, else a new TreapStats.
+
+    Returns:
+        `treap`, whose statistics are then in `treap.stats`.
+    """
+    if stats is None:
+        stats = getattr(treap, "stats", None) or TreapStats()
+    treap.__class__ = instrumented_class(type(treap))
+    treap.stats = stats
+    return treap
+
+
+def uninstrument(treap: TreapMap) -> TreapStats:
+    """Stop collecting statistics for `treap` and return what was collected.
+
+    Raises:
+        ValueError: If `treap` is not instrumented.
+    """
+    cls = type(treap)
+    if "_instrumented_class" not in cls.__dict__:
+        raise ValueError("treap is not instrumented")
+    treap.__class__ = cls._uninstrumented_class
+    stats = treap.stats
+    del treap.stats
+    return stats
+
+
+InstrumentedTreapMap = instrumented_class(TreapMap)
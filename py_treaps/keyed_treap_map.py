@@ -0,0 +1,226 @@
+from __future__ import annotations
+from collections.abc import AsyncIterator, Iterable, Iterator
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, List, Optional, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.priority import PrioritySource
+from py_treaps.treap import Treap
+from py_treaps.treap_map import DEFAULT_BUDGET, TreapMap
+from py_treaps.treap_node import TreapNode
+
+
+class KeyedNode(TreapNode):
+    """A TreapNode whose `key` is a cached sort key.
+
+    Attributes:
+        item_key: The key as it was inserted; `key` holds its sort key.
+    """
+
+    __slots__ = ("item_key",)
+
+
+class KeyedTreapMap(TreapMap[KT, VT]):
+    """A TreapMap ordered by a key function, like `sorted(key=...)`.
+
+    The sort key of each entry is computed once, when it is inserted, and
+    cached in its node; every search compares sort keys only. A key
+    function that maps expensive keys (say, dataclasses with generated
+    comparison methods) to ints, floats, strings or tuples of them makes
+    each comparison a C-level one. Lookups and removes call the key
+    function once for the search key.
+
+    Two keys with equal sort keys are the same entry, as for `sorted`:
+    inserting one replaces the stored key as well as the value, while the
+    set operations keep the key of either entry. Nodes returned by
+    `get_root_node` and `locate`, and the `resolve` functions of the set
+    operations, see the sort key.
+
+    Args:
+        key: Maps a key to its sort key.
+        priorities: Priority source for new nodes, called with sort keys.
+    """
+
+    _node_class = KeyedNode
+
+    def __init__(
+        self, key: Callable[[KT], Any], priorities: Optional[PrioritySource] = None
+    ):
+        super().__init__(priorities)
+        self.sort_key = key
+
+    def _empty(self) -> KeyedTreapMap[KT, VT]:
+        return KeyedTreapMap(self.sort_key, self.priorities)
+
+    def _compatible(self, other: TreapMap[KT, VT]) -> bool:
+        return super()._compatible(other) and other.sort_key is self.sort_key
+
+    def _keyed_nodes(self, entries: Iterable[Tuple[Any, KT, VT]]) -> Iterator[TreapNode]:
+        # Turn (sort key, key, value) triples in ascending sort key order
+        # into detached nodes, keeping the last entry of each sort key.
+        new_priority = self.priorities
+        node = None
+        for sort_key, key, value in entries:
+            if node is not None:
+                if not node.key < sort_key:
+                    if sort_key == node.key:
+                        node.item_key, node.value = key, value
+                        continue
+                    raise ValueError("from_sorted requires keys in ascending order")
+                yield node
+            node = KeyedNode(sort_key, value, None, new_priority(sort_key))
+            node.item_key = key
+        if node is not None:
+            yield node
+
+    def _sorted_nodes(self, items: Iterable[Tuple[KT, VT]]) -> Iterator[TreapNode]:
+        sort_key = self.sort_key
+        return self._keyed_nodes((sort_key(key), key, value) for key, value in items)
+
+    def _build_like(self, items: Iterable[Tuple[KT, VT]]) -> KeyedTreapMap[KT, VT]:
+        # Decorate once, so the key function runs once per item.
+        sort_key = self.sort_key
+        entries = sorted(
+            ((sort_key(key), key, value) for key, value in items), key=itemgetter(0)
+        )
+        treap = self._empty()
+        treap._link_sorted(treap._keyed_nodes(entries))
+        return treap
+
+    @classmethod
+    def from_sorted(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        key: Callable[[KT], Any],
+        priorities: Optional[PrioritySource] = None,
+    ) -> KeyedTreapMap[KT, VT]:
+        """Build a KeyedTreapMap from pairs in ascending sort key order.
+
+        Raises:
+            ValueError: If the sort keys are not in ascending order.
+        """
+        treap = cls(key, priorities)
+        treap._link_sorted(treap._sorted_nodes(items))
+        return treap
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        key: Callable[[KT], Any],
+        priorities: Optional[PrioritySource] = None,
+    ) -> KeyedTreapMap[KT, VT]:
+        """Build a KeyedTreapMap from pairs in any order; the last value wins."""
+        return cls(key, priorities)._build_like(items)
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        return super().lookup(self.sort_key(key))
+
+    def locate(self, key: KT) -> Optional[TreapNode]:
+        return super().locate(self.sort_key(key))
+
+    def insert(
+        self, key: KT, value: VT, hint: Optional[TreapNode] = None
+    ) -> TreapNode:
+        node = super().insert(self.sort_key(key), value, hint)
+        node.item_key = key
+        return node
+
+    def append(self, key: KT, value: VT) -> TreapNode:
+        node = super().append(self.sort_key(key), value)
+        node.item_key = key
+        return node
+
+    def remove(self, key: KT) -> Optional[VT]:
+        return super().remove(self.sort_key(key))
+
+    def split(self, threshold: KT) -> List[Treap[KT, VT]]:
+        return super().split(self.sort_key(threshold))
+
+    def lookup_many(self, keys: Iterable[KT], default: Any = None) -> List[Any]:
+        """Look up a batch of keys; see `TreapMap.lookup_many`.
+
+        Always returns a list, since the sort keys need not be numeric.
+        """
+        return super().lookup_many(list(map(self.sort_key, keys)), default)
+
+    def rank(self, key: KT) -> int:
+        return super().rank(self.sort_key(key))
+
+    def select(self, index: int) -> KT:
+        return self._select_node(index).item_key
+
+    def count_range(
+        self, lo: KT, hi: KT, inclusive: Tuple[bool, bool] = (True, True)
+    ) -> int:
+        return super().count_range(self.sort_key(lo), self.sort_key(hi), inclusive)
+
+    def floor(self, key: KT) -> Optional[KT]:
+        node = self._floor_node(self.sort_key(key), True)
+        return node.item_key if node is not None else None
+
+    def ceiling(self, key: KT) -> Optional[KT]:
+        node = self._ceiling_node(self.sort_key(key), True)
+        return node.item_key if node is not None else None
+
+    def predecessor(self, key: KT) -> Optional[KT]:
+        node = self._floor_node(self.sort_key(key), False)
+        return node.item_key if node is not None else None
+
+    def successor(self, key: KT) -> Optional[KT]:
+        node = self._ceiling_node(self.sort_key(key), False)
+        return node.item_key if node is not None else None
+
+    def peek_min(self) -> Optional[Tuple[KT, VT]]:
+        node = self._extreme(True)
+        return (node.item_key, node.value) if node is not None else None
+
+    def peek_max(self) -> Optional[Tuple[KT, VT]]:
+        node = self._extreme(False)
+        return (node.item_key, node.value) if node is not None else None
+
+    def pop_min(self) -> Optional[Tuple[KT, VT]]:
+        node = self._pop_extreme(True)
+        return (node.item_key, node.value) if node is not None else None
+
+    def pop_max(self) -> Optional[Tuple[KT, VT]]:
+        node = self._pop_extreme(False)
+        return (node.item_key, node.value) if node is not None else None
+
+    def items(self) -> Iterator[Tuple[KT, VT]]:
+        return ((node.item_key, node.value) for node in self._in_order())
+
+    def irange(
+        self,
+        lo: Optional[KT] = None,
+        hi: Optional[KT] = None,
+        inclusive: Tuple[bool, bool] = (True, True),
+        reverse: bool = False,
+    ) -> Iterator[KT]:
+        sort_key = self.sort_key
+        nodes = self._range_nodes(
+            sort_key(lo) if lo is not None else None,
+            sort_key(hi) if hi is not None else None,
+            inclusive,
+            reverse,
+        )
+        return map(attrgetter("item_key"), nodes)
+
+    def __iter__(self) -> Iterator[KT]:
+        return map(attrgetter("item_key"), self._in_order())
+
+    async def akeys(
+        self,
+        chunk_size: Optional[int] = None,
+        budget: Optional[float] = DEFAULT_BUDGET,
+    ) -> AsyncIterator[KT]:
+        async for node in self._anodes(chunk_size, budget):
+            yield node.item_key
+
+    async def aitems(
+        self,
+        chunk_size: Optional[int] = None,
+        budget: Optional[float] = DEFAULT_BUDGET,
+    ) -> AsyncIterator[Tuple[KT, VT]]:
+        async for node in self._anodes(chunk_size, budget):
+            yield node.item_key, node.value
@@ -0,0 +1,371 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from operator import itemgetter
+from typing import Any, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch APIs fall back to lists.
+    np = None
+
+from py_treaps.aggregate_treap_map import AggregateNode, AggregateTreapMap
+from py_treaps.comparable import KT, VT
+from py_treaps.monoid import Action, Monoid
+from py_treaps.priority import PrioritySource
+from py_treaps.treap_map import TreapMap
+from py_treaps.treap_node import TreapNode
+
+
+class LazyNode(AggregateNode):
+    """An AggregateNode that can hold an update pending for its subtree.
+
+    Attributes:
+        pending: A tag already applied to this node's value and aggregate
+            but not yet to its children, or None.
+    """
+
+    __slots__ = ("pending",)
+
+    def __init__(
+        self,
+        key: KT,
+        value: VT,
+        parent: Optional[TreapNode] = None,
+        priority: Optional[int] = None,
+    ):
+        super().__init__(key, value, parent, priority)
+        self.pending: Any = None
+
+
+class LazyTreapMap(AggregateTreapMap[KT, VT]):
+    """An AggregateTreapMap supporting O(log n) range updates of values.
+
+    `range_update` applies a tag of `action` to the subtree roots that
+    cover a key range, and each tag is pushed down to the children only
+    when a later operation walks through that node. Every traversal
+    pushes along its path before reading values or relinking children,
+    so rotations, split, join and the set operations all see settled
+    nodes.
+
+    Args:
+        monoid: The monoid to aggregate, e.g. `py_treaps.monoid.SUM`.
+        action: How tags update values and this monoid's aggregates,
+            e.g. `py_treaps.monoid.ADD_TO_SUM`.
+        priorities: Priority source for new nodes.
+    """
+
+    _node_class = LazyNode
+
+    def __init__(
+        self,
+        monoid: Monoid,
+        action: Action,
+        priorities: Optional[PrioritySource] = None,
+    ):
+        super().__init__(monoid, priorities)
+        self.action = action
+
+    def _empty(self) -> LazyTreapMap[KT, VT]:
+        return LazyTreapMap(self.monoid, self.action, self.priorities)
+
+    def _compatible(self, other: TreapMap[KT, VT]) -> bool:
+        return super()._compatible(other) and other.action is self.action
+
+    @classmethod
+    def from_sorted(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        monoid: Monoid,
+        action: Action,
+        priorities: Optional[PrioritySource] = None,
+    ) -> LazyTreapMap[KT, VT]:
+        treap = cls(monoid, action, priorities)
+        treap._link_sorted(treap._sorted_nodes(items))
+        return treap
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        monoid: Monoid,
+        action: Action,
+        priorities: Optional[PrioritySource] = None,
+    ) -> LazyTreapMap[KT, VT]:
+        return cls.from_sorted(
+            sorted(items, key=itemgetter(0)), monoid, action, priorities
+        )
+
+    def _apply(self, node: LazyNode, tag: Any) -> None:
+        action = self.action
+        node.value = action.apply_value(tag, node.value)
+        node.aggregate = action.apply_aggregate(tag, node.aggregate, node.size)
+        node.pending = tag if node.pending is None else action.compose(tag, node.pending)
+
+    def _push(self, node: LazyNode) -> None:
+        tag = node.pending
+        if tag is not None:
+            node.pending = None
+            if node.left_child is not None:
+                self._apply(node.left_child, tag)
+            if node.right_child is not None:
+                self._apply(node.right_child, tag)
+
+    def _push_path(
+        self, node: Optional[LazyNode], key: KT, equal_right: bool = False
+    ) -> Optional[LazyNode]:
+        # Push along the split path for key (equal keys go left unless
+        # equal_right), which covers the search path of key too. Returns
+        # the node holding key.
+        found = None
+        while node is not None:
+            self._push(node)
+            if node.key < key:
+                node = node.right_child
+            elif key == node.key:
+                found = node
+                node = node.right_child if equal_right else node.left_child
+            else:
+                node = node.left_child
+        return found
+
+    def _push_spine(self, node: Optional[LazyNode], right: bool) -> None:
+        while node is not None:
+            self._push(node)
+            node = node.right_child if right else node.left_child
+
+    def _left_rotate(self, x: TreapNode) -> None:
+        self._push(x)
+        self._push(x.right_child)
+        super()._left_rotate(x)
+
+    def _right_rotate(self, y: TreapNode) -> None:
+        self._push(y)
+        self._push(y.left_child)
+        super()._right_rotate(y)
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        node = self._push_path(self.root, key)
+        return node.value if node is not None else None
+
+    def _extreme(self, leftmost: bool) -> Optional[TreapNode]:
+        # Settle the spine above the extreme node before its value is read.
+        self._push_spine(self.root, not leftmost)
+        return super()._extreme(leftmost)
+
+    def lookup_many(self, keys: Iterable[KT], default: Any = None) -> Any:
+        # The batched descent of TreapMap.lookup_many, pushing each node
+        # before its value or children are read. NumPy arrays are looked
+        # up as lists, since tags may turn values into any object.
+        if np is not None and isinstance(keys, np.ndarray):
+            results = np.empty(len(keys), dtype=object)
+            for index, value in enumerate(self.lookup_many(keys.tolist(), default)):
+                results[index] = value
+            return results
+
+        keys = list(keys)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        sorted_keys = [keys[i] for i in order]
+        results = [default] * len(keys)
+        stack = [(self.root, 0, len(keys))] if self.root is not None else []
+        while stack:
+            node, lo, hi = stack.pop()
+            self._push(node)
+            key = node.key
+            i = bisect_left(sorted_keys, key, lo, hi)
+            j = bisect_right(sorted_keys, key, i, hi)
+            for index in range(i, j):
+                results[order[index]] = node.value
+            if lo < i and node.left_child is not None:
+                stack.append((node.left_child, lo, i))
+            if j < hi and node.right_child is not None:
+                stack.append((node.right_child, j, hi))
+        return results
+
+    def locate(self, key: KT) -> Optional[TreapNode]:
+        # Settle the path so the node's value reflects every tag above it.
+        return self._push_path(self.root, key)
+
+    def insert(
+        self, key: KT, value: VT, hint: Optional[TreapNode] = None
+    ) -> TreapNode:
+        # A search starting at hint would miss tags pending above it, so
+        # the hint is ignored and the path is pushed from the root.
+        self._push_path(self.root, key)
+        return super().insert(key, value)
+
+    def append(self, key: KT, value: VT) -> TreapNode:
+        self._push_spine(self.root, True)
+        return super().append(key, value)
+
+    def remove(self, key: KT) -> Optional[VT]:
+        # The rotations on the way down push the children they move.
+        self._push_path(self.root, key)
+        return super().remove(key)
+
+    def _split_nodes(
+        self, node: Optional[TreapNode], threshold: KT
+    ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
+        self._push_path(node, threshold)
+        return super()._split_nodes(node, threshold)
+
+    def _split_at(
+        self, node: Optional[TreapNode], key: KT
+    ) -> Tuple[Optional[TreapNode], Optional[TreapNode], Optional[TreapNode]]:
+        self._push_path(node, key)
+        return super()._split_at(node, key)
+
+    def _merge_nodes(
+        self, a: Optional[TreapNode], b: Optional[TreapNode]
+    ) -> Optional[TreapNode]:
+        self._push_spine(a, True)
+        self._push_spine(b, False)
+        return super()._merge_nodes(a, b)
+
+    def _detach_children(
+        self, node: TreapNode
+    ) -> Tuple[Optional[TreapNode], Optional[TreapNode]]:
+        self._push(node)
+        return super()._detach_children(node)
+
+    def range_aggregate(
+        self,
+        lo: Optional[KT] = None,
+        hi: Optional[KT] = None,
+        inclusive: Tuple[bool, bool] = (True, True),
+    ) -> Any:
+        # Only nodes on the boundary paths of lo and hi are read directly.
+        # The walk passes a node equal to lo on the right when lo is
+        # exclusive, and one equal to hi on the right when hi is inclusive.
+        lo_inclusive, hi_inclusive = inclusive
+        if lo is not None:
+            self._push_path(self.root, lo, not lo_inclusive)
+        if hi is not None:
+            self._push_path(self.root, hi, hi_inclusive)
+        return super().range_aggregate(lo, hi, inclusive)
+
+    def range_update(
+        self,
+        lo: Optional[KT],
+        hi: Optional[KT],
+        tag: Any,
+        inclusive: Tuple[bool, bool] = (True, True),
+    ) -> None:
+        """Apply the update `tag` to every value with a key between `lo` and `hi`.
+
+        The range is split out, tagged at its root and merged back, which
+        takes O(log n) expected time whatever the size of the range.
+
+        Args:
+            lo: Lower bound, or None for no lower bound.
+            hi: Upper bound, or None for no upper bound.
+            tag: The update, in the form `action` expects.
+            inclusive: Whether `lo` and `hi` themselves are updated.
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        parts: List[Tuple[Optional[TreapNode], bool]] = []
+        rest = self.root
+        self.root = None
+        if lo is not None:
+            below, equal, rest = self._split_at(rest, lo)
+            parts.append((below, False))
+            parts.append((self._single(equal), lo_inclusive))
+        if hi is not None:
+            middle, equal, above = self._split_at(rest, hi)
+            parts.append((middle, True))
+            parts.append((self._single(equal), hi_inclusive))
+            parts.append((above, False))
+        else:
+            parts.append((rest, True))
+
+        try:
+            for node, selected in parts:
+                if selected and node is not None:
+                    self._apply(node, tag)
+        finally:
+            root = None
+            for node, _ in parts:
+                root = self._merge_nodes(root, node)
+            self._set_root(root)
+
+    def _single(self, node: Optional[TreapNode]) -> Optional[TreapNode]:
+        # _split_at leaves the cut-out node's old child links in place.
+        if node is not None:
+            node.parent = node.left_child = node.right_child = None
+            self._update(node)
+        return node
+
+    def _in_order(self) -> Iterator[TreapNode]:
+        stack = []
+        node = self.root
+        while True:
+            while node is not None:
+                self._push(node)
+                stack.append(node)
+                node = node.left_child
+            if not stack:
+                return
+            node = stack.pop()
+            yield node
+            node = node.right_child
+
+    def _range_nodes(
+        self,
+        lo: Optional[KT],
+        hi: Optional[KT],
+        inclusive: Tuple[bool, bool],
+        reverse: bool,
+    ) -> Iterator[TreapNode]:
+        # The plain range walk, pushing each node before its children are
+        # read, so a scan settles only the nodes it reaches.
+        lo_inclusive, hi_inclusive = inclusive
+        push = self._push
+        stack = []
+        node = self.root
+        if not reverse:
+            while node is not None:
+                push(node)
+                key = node.key
+                if lo is not None and (key < lo or (key == lo and not lo_inclusive)):
+                    node = node.right_child
+                else:
+                    stack.append(node)
+                    node = node.left_child
+            while stack:
+                node = stack.pop()
+                if hi is not None:
+                    key = node.key
+                    if hi < key or (key == hi and not hi_inclusive):
+                        return
+                yield node
+                node = node.right_child
+                while node is not None:
+                    push(node)
+                    stack.append(node)
+                    node = node.left_child
+        else:
+            while node is not None:
+                push(node)
+                key = node.key
+                if hi is not None and (hi < key or (key == hi and not hi_inclusive)):
+                    node = node.left_child
+                else:
+                    stack.append(node)
+                    node = node.right_child
+            while stack:
+                node = stack.pop()
+                if lo is not None:
+                    key = node.key
+                    if key < lo or (key == lo and not lo_inclusive):
+                        return
+                yield node
+                node = node.left_child
+                while node is not None:
+                    push(node)
+                    stack.append(node)
+                    node = node.right_child
+
+    def __str__(self) -> str:
+        for _ in self._in_order():
+            pass
+        return super().__str__()
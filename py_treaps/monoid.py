@@ -0,0 +1,113 @@
+"""
+Monoids for subtree aggregates.
+
+A monoid pairs an associative `combine` with its `identity`. `lift` maps
+a node's key and value to the monoid, so one treap can aggregate, say,
+the count of its entries or the sum of their values.
+"""
+
+from __future__ import annotations
+import math
+import operator
+from typing import Any, Callable, Optional
+
+
+def _value(key: Any, value: Any) -> Any:
+    return value
+
+
+def _one(key: Any, value: Any) -> int:
+    return 1
+
+
+class Monoid:
+    """An associative operation with an identity element.
+
+    `combine` need not be commutative: aggregates always combine entries
+    in ascending key order.
+
+    Args:
+        identity: The aggregate of no entries.
+        combine: Associative function merging two aggregates.
+        lift: Maps `(key, value)` of one entry to an aggregate. Defaults
+            to the value.
+    """
+
+    __slots__ = ("identity", "combine", "lift")
+
+    def __init__(
+        self,
+        identity: Any,
+        combine: Callable[[Any, Any], Any],
+        lift: Optional[Callable[[Any, Any], Any]] = None,
+    ) -> None:
+        self.identity = identity
+        self.combine = combine
+        self.lift = _value if lift is None else lift
+
+
+SUM = Monoid(0, operator.add)
+MIN = Monoid(math.inf, min)
+MAX = Monoid(-math.inf, max)
+COUNT = Monoid(0, operator.add, _one)
+
+
+class Action:
+    """A family of value updates that can be applied lazily to subtrees.
+
+    A tag describes one update, such as "add 5". Pending tags are stored
+    on subtree roots and pushed down on later visits, so they have to
+    compose, and an aggregate has to be updatable without visiting the
+    subtree it summarizes.
+
+    Args:
+        apply_value: `apply_value(tag, value)` returns the updated value.
+        apply_aggregate: `apply_aggregate(tag, aggregate, size)` returns
+            the aggregate of a subtree of `size` entries after the update.
+        compose: `compose(outer, inner)` returns the tag equal to applying
+            `inner` and then `outer`.
+    """
+
+    __slots__ = ("apply_value", "apply_aggregate", "compose")
+
+    def __init__(
+        self,
+        apply_value: Callable[[Any, Any], Any],
+        apply_aggregate: Callable[[Any, Any, int], Any],
+        compose: Callable[[Any, Any], Any],
+    ) -> None:
+        self.apply_value = apply_value
+        self.apply_aggregate = apply_aggregate
+        self.compose = compose
+
+
+def _affine(tag: Any, value: Any) -> Any:
+    scale, offset = tag
+    return scale * value + offset
+
+
+def _compose_affine(outer: Any, inner: Any) -> Any:
+    return (outer[0] * inner[0], outer[0] * inner[1] + outer[1])
+
+
+def _check_scale(tag: Any) -> Any:
+    if tag[0] < 0:
+        raise ValueError("a negative scale would swap minimum and maximum")
+    return tag
+
+
+# Tag: a number added to every value.
+ADD_TO_SUM = Action(operator.add, lambda tag, total, size: total + tag * size, operator.add)
+ADD_TO_MIN_MAX = Action(operator.add, lambda tag, extreme, size: extreme + tag, operator.add)
+
+# Tag: (scale, offset), mapping each value v to scale * v + offset.
+AFFINE_TO_SUM = Action(
+    _affine,
+    lambda tag, total, size: tag[0] * total + tag[1] * size,
+    _compose_affine,
+)
+AFFINE_TO_MIN_MAX = Action(
+    lambda tag, value: _affine(_check_scale(tag), value),
+    lambda tag, extreme, size: _affine(tag, extreme),
+    _compose_affine,
+)
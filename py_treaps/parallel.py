@@ -0,0 +1,276 @@
+"""
+Process-pool bulk operations on TreapMap by key-range sharding.
+
+The key space is cut into k ranges at quantiles of a random sample of the
+keys. Each range is handled by a worker process, which sends its shard
+back in a compact columnar form: a list of keys, a list of values and an
+`array` of priorities, in key order. The parent links each shard with the
+O(n) stack build and stitches the shards together with k - 1 joins,
+which is valid because the ranges are disjoint and ordered.
+
+Only the per-shard work (sorting and priority generation, `resolve` and
+value transform calls) runs in parallel. Partitioning, pickling and
+allocating the nodes stay in the parent, since the nodes must live in its
+heap, and bound the achievable speedup.
+"""
+
+from __future__ import annotations
+import os
+import pickle
+import random
+from array import array
+from bisect import bisect_right
+from concurrent.futures import Executor, ProcessPoolExecutor
+from operator import itemgetter
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.keyed_treap_map import KeyedTreapMap
+from py_treaps.priority import PrioritySource, RandomPriority, default_priority_source
+from py_treaps.treap_map import TreapMap
+
+# Keys sampled per shard when choosing boundaries.
+SAMPLES_PER_SHARD = 64
+
+# A shard in transit: keys, values and priorities, in key order.
+Columns = Tuple[List[Any], List[Any], "array[int]"]
+
+
+def _boundaries(keys: Sequence[KT], shards: int) -> List[KT]:
+    # k - 1 distinct split keys at evenly spaced quantiles of a sample.
+    if shards <= 1 or not keys:
+        return []
+    rng = random.Random(len(keys))
+    sample = sorted(rng.sample(keys, min(len(keys), shards * SAMPLES_PER_SHARD)))
+    cuts: List[KT] = []
+    for i in range(1, shards):
+        key = sample[i * len(sample) // shards]
+        if not cuts or cuts[-1] < key:
+            cuts.append(key)
+    return cuts
+
+
+def _shard_priorities(priorities: PrioritySource, shard: int) -> PrioritySource:
+    # A seeded source would replay the same stream in every worker.
+    if isinstance(priorities, RandomPriority) and priorities.seed is not None:
+        return RandomPriority(priorities.seed * 1_000_003 + shard)
+    return priorities
+
+
+def _to_columns(treap: TreapMap) -> Columns:
+    nodes = list(treap._in_order())
+    return (
+        [node.key for node in nodes],
+        [node.value for node in nodes],
+        array("Q", [node.priority for node in nodes]),
+    )
+
+
+def _from_columns(columns: Columns, like: TreapMap) -> TreapMap:
+    # Link a shard into an empty treap configured like `like`, with its
+    # node class, so augmented subclasses recompute their node data.
+    keys, values, node_priorities = columns
+    treap = like._empty()
+    treap._link_sorted(
+        map(like._node_class, keys, values, [None] * len(keys), node_priorities)
+    )
+    return treap
+
+
+def _check_columnar(*treaps: TreapMap) -> None:
+    # Columns carry each node's key, value and priority. Any other node
+    # data must be derivable from those, which rules out KeyedTreapMap:
+    # its nodes hold the original key beside the sort key.
+    for treap in treaps:
+        if isinstance(treap, KeyedTreapMap):
+            raise TypeError(f"{type(treap).__name__} can't be sharded across processes")
+
+
+def _build_shard(items: List[Tuple[KT, VT]], priorities: PrioritySource) -> Columns:
+    # A stable sort keeps the last value of a repeated key last.
+    items.sort(key=itemgetter(0))
+    keys: List[Any] = []
+    values: List[Any] = []
+    for key, value in items:
+        if keys and not keys[-1] < key:
+            values[-1] = value
+        else:
+            keys.append(key)
+            values.append(value)
+    return keys, values, array("Q", map(priorities, keys))
+
+
+def _meld_shard(
+    left: Columns,
+    right: Columns,
+    priorities: PrioritySource,
+    resolve: Optional[Callable[[Any, Any, Any], Any]],
+) -> Columns:
+    like: TreapMap = TreapMap(priorities)
+    treap = _from_columns(left, like)
+    treap.meld(_from_columns(right, like), resolve)
+    return _to_columns(treap)
+
+
+def _map_shard(columns: Columns, fn: Callable[[Any], Any]) -> Columns:
+    # Keys and priorities are untouched, so the shard keeps its shape.
+    keys, values, node_priorities = columns
+    return keys, [fn(value) for value in values], node_priorities
+
+
+def _split_shards(treap: TreapMap, cuts: List[KT]) -> List[TreapMap]:
+    # k - 1 O(log n) splits; empties treap.
+    shards = []
+    rest = treap
+    for cut in cuts:
+        below, rest = rest.split(cut)
+        shards.append(below)
+    shards.append(rest)
+    return shards
+
+
+def _restore(treap: TreapMap, shards: List[TreapMap]) -> None:
+    # Undo _split_shards on a failure: the shards are untouched, since
+    # only copies of their entries were sent to the workers.
+    for shard in shards:
+        treap.join(shard)
+
+
+def _run(
+    submit: Callable[[Executor], List[Any]],
+    like: TreapMap,
+    workers: Optional[int],
+    executor: Optional[Executor],
+) -> TreapMap:
+    # Submit every shard, then join the results in key order into a treap
+    # configured like `like`.
+    pool = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+    try:
+        result = like._empty()
+        for future in submit(pool):
+            result.join(_from_columns(future.result(), like))
+        return result
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+
+def _shard_count(workers: Optional[int]) -> int:
+    return workers or os.cpu_count() or 1
+
+
+def parallel_from_items(
+    items: Iterable[Tuple[KT, VT]],
+    workers: Optional[int] = None,
+    priorities: Optional[PrioritySource] = None,
+    executor: Optional[Executor] = None,
+) -> TreapMap[KT, VT]:
+    """Build a TreapMap from unsorted pairs, sorting shards in parallel.
+
+    Equivalent to `TreapMap.from_items`: the last value for a key wins.
+
+    Args:
+        items: Key-value pairs in any order.
+        workers: Number of shards and worker processes (default: CPU count).
+        priorities: Priority source for the new treap. Must be picklable.
+        executor: An existing executor to use instead of a new process pool.
+    """
+    if priorities is None:
+        priorities = default_priority_source
+    items = list(items)
+    cuts = _boundaries([item[0] for item in items], _shard_count(workers))
+    buckets: List[List[Tuple[KT, VT]]] = [[] for _ in range(len(cuts) + 1)]
+    for item in items:
+        buckets[bisect_right(cuts, item[0])].append(item)
+    del items
+
+    return _run(
+        lambda pool: [
+            pool.submit(_build_shard, bucket, _shard_priorities(priorities, i))
+            for i, bucket in enumerate(buckets)
+        ],
+        TreapMap(priorities),
+        workers,
+        executor,
+    )
+
+
+def parallel_meld(
+    treap: TreapMap[KT, VT],
+    other: TreapMap[KT, VT],
+    resolve: Optional[Callable[[KT, VT, VT], VT]] = None,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> None:
+    """`treap.meld(other, resolve)` with each key range melded in a worker.
+
+    Both treaps are split at the same sampled boundaries and `other` ends
+    up empty. Shipping the shards costs O(n + m) in this process, so this
+    only beats `meld` when `resolve` is expensive. `resolve` must be
+    picklable, e.g. a module-level function.
+
+    Subclasses such as AggregateTreapMap get their result rebuilt with
+    their own node class. If `resolve` can't be pickled or a worker
+    raises, both treaps are put back as they were and the exception
+    propagates.
+
+    Raises:
+        TypeError: If either treap is a KeyedTreapMap.
+    """
+    priorities = treap.priorities
+    # Fail before splitting anything if the shards can't reach the workers.
+    _check_columnar(treap, other)
+    pickle.dumps(resolve)
+    larger = treap if len(treap) >= len(other) else other
+    cuts = _boundaries(list(larger), _shard_count(workers))
+    mine, theirs = _split_shards(treap, cuts), _split_shards(other, cuts)
+
+    try:
+        result = _run(
+            lambda pool: [
+                pool.submit(_meld_shard, _to_columns(a), _to_columns(b), priorities, resolve)
+                for a, b in zip(mine, theirs)
+            ],
+            treap,
+            workers,
+            executor,
+        )
+    except BaseException:
+        _restore(treap, mine)
+        _restore(other, theirs)
+        raise
+    treap._set_root(result.root)
+
+
+def parallel_map_values(
+    treap: TreapMap[KT, VT],
+    fn: Callable[[VT], Any],
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> None:
+    """Replace every value v with `fn(v)`, calling `fn` in worker processes.
+
+    Keys and priorities are unchanged, so the treap keeps its shape.
+    `fn` must be picklable. If it can't be pickled or a call raises, the
+    treap is left unchanged and the exception propagates. Subclasses such
+    as AggregateTreapMap recompute their node data for the new values.
+
+    Raises:
+        TypeError: If `treap` is a KeyedTreapMap.
+    """
+    _check_columnar(treap)
+    pickle.dumps(fn)
+    cuts = _boundaries(list(treap), _shard_count(workers))
+    pieces = _split_shards(treap, cuts)
+
+    try:
+        result = _run(
+            lambda pool: [pool.submit(_map_shard, _to_columns(piece), fn) for piece in pieces],
+            treap,
+            workers,
+            executor,
+        )
+    except BaseException:
+        _restore(treap, pieces)
+        raise
+    treap._set_root(result.root)
@@ -0,0 +1,263 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from operator import itemgetter
+from typing import Generic, List, Optional, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.priority import PrioritySource, default_priority_source
+
+
+class PersistentNode:
+    """An immutable treap node without a parent pointer.
+
+    Nodes are never modified after construction, so any number of
+    PersistentTreapMap versions can share a subtree.
+
+    Attributes:
+        key (KT): The key of the node.
+        value (VT): The value associated with the key of the node.
+        priority (int): The priority of the node.
+        left_child (PersistentNode): The left child of the node.
+        right_child (PersistentNode): The right child of the node.
+        size (int): The number of nodes in the subtree rooted here.
+    """
+
+    __slots__ = ("key", "value", "priority", "left_child", "right_child", "size")
+
+    def __init__(
+        self,
+        key: KT,
+        value: VT,
+        priority: int,
+        left_child: Optional[PersistentNode] = None,
+        right_child: Optional[PersistentNode] = None,
+    ):
+        self.key: KT = key
+        self.value: VT = value
+        self.priority: int = priority
+        self.left_child: Optional[PersistentNode] = left_child
+        self.right_child: Optional[PersistentNode] = right_child
+        self.size: int = (
+            1
+            + (left_child.size if left_child is not None else 0)
+            + (right_child.size if right_child is not None else 0)
+        )
+
+    def with_children(
+        self, left_child: Optional[PersistentNode], right_child: Optional[PersistentNode]
+    ) -> PersistentNode:
+        return PersistentNode(self.key, self.value, self.priority, left_child, right_child)
+
+
+def _split(
+    node: Optional[PersistentNode], key: KT
+) -> Tuple[Optional[PersistentNode], Optional[PersistentNode], Optional[PersistentNode]]:
+    # Split into keys < key, the node holding key, and keys > key, copying
+    # only the nodes on the search path.
+    if node is None:
+        return None, None, None
+    if node.key < key:
+        below, equal, above = _split(node.right_child, key)
+        return node.with_children(node.left_child, below), equal, above
+    if key < node.key:
+        below, equal, above = _split(node.left_child, key)
+        return below, equal, node.with_children(above, node.right_child)
+    return node.left_child, node, node.right_child
+
+
+def _merge(
+    a: Optional[PersistentNode], b: Optional[PersistentNode]
+) -> Optional[PersistentNode]:
+    # Every key in a must be less than every key in b.
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority >= b.priority:
+        return a.with_children(a.left_child, _merge(a.right_child, b))
+    return b.with_children(_merge(a, b.left_child), b.right_child)
+
+
+def _assign(node: PersistentNode, key: KT, value: VT) -> PersistentNode:
+    # Copy the path to the existing node holding key with its new value.
+    if key < node.key:
+        return node.with_children(_assign(node.left_child, key, value), node.right_child)
+    if node.key < key:
+        return node.with_children(node.left_child, _assign(node.right_child, key, value))
+    return PersistentNode(key, value, node.priority, node.left_child, node.right_child)
+
+
+def _insert(
+    node: Optional[PersistentNode], key: KT, value: VT, priority: int
+) -> PersistentNode:
+    # key must not be present. The new node goes where its priority first
+    # beats the path, taking the split of the subtree it replaces.
+    if node is None or priority > node.priority:
+        below, _, above = _split(node, key)
+        return PersistentNode(key, value, priority, below, above)
+    if key < node.key:
+        return node.with_children(
+            _insert(node.left_child, key, value, priority), node.right_child
+        )
+    return node.with_children(
+        node.left_child, _insert(node.right_child, key, value, priority)
+    )
+
+
+def _remove(node: PersistentNode, key: KT) -> PersistentNode:
+    if key < node.key:
+        return node.with_children(_remove(node.left_child, key), node.right_child)
+    if node.key < key:
+        return node.with_children(node.left_child, _remove(node.right_child, key))
+    return _merge(node.left_child, node.right_child)
+
+
+class PersistentTreapMap(Generic[KT, VT], Iterable):
+    """An immutable TreapMap whose updates return new versions.
+
+    Each update copies only the O(log n) expected nodes on its search
+    path and shares every other subtree with the version it came from, so
+    old versions stay valid and `snapshot` is free.
+    """
+
+    def __init__(self, priorities: Optional[PrioritySource] = None):
+        self.root: Optional[PersistentNode] = None
+        self.priorities: PrioritySource = (
+            default_priority_source if priorities is None else priorities
+        )
+
+    def _version(self, root: Optional[PersistentNode]) -> PersistentTreapMap[KT, VT]:
+        version = PersistentTreapMap(self.priorities)
+        version.root = root
+        return version
+
+    @classmethod
+    def from_sorted(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        priorities: Optional[PrioritySource] = None,
+    ) -> PersistentTreapMap[KT, VT]:
+        """Build a PersistentTreapMap from pairs in ascending key order.
+
+        Repeated keys must be adjacent; the last value wins.
+
+        Raises:
+            ValueError: If the keys are not in ascending order.
+        """
+        treap = cls(priorities)
+        new_priority = treap.priorities
+        # The right spine is kept as [key, value, priority, left node]
+        # entries. Nodes are immutable, so an entry is frozen into a node
+        # only once it leaves the spine and its subtree can't change.
+        stack: List[list] = []
+        frozen: Optional[PersistentNode] = None
+
+        def freeze(entry: list, right: Optional[PersistentNode]) -> PersistentNode:
+            return PersistentNode(entry[0], entry[1], entry[2], entry[3], right)
+
+        for key, value in items:
+            if stack:
+                top = stack[-1]
+                if not top[0] < key:
+                    if key == top[0]:
+                        top[1] = value
+                        continue
+                    raise ValueError("from_sorted requires keys in ascending order")
+            priority = new_priority(key)
+            frozen = None
+            while stack and stack[-1][2] < priority:
+                frozen = freeze(stack.pop(), frozen)
+            stack.append([key, value, priority, frozen])
+
+        frozen = None
+        while stack:
+            frozen = freeze(stack.pop(), frozen)
+        treap.root = frozen
+        return treap
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        priorities: Optional[PrioritySource] = None,
+    ) -> PersistentTreapMap[KT, VT]:
+        """Build a PersistentTreapMap from pairs in any order."""
+        return cls.from_sorted(sorted(items, key=itemgetter(0)), priorities)
+
+    def get_root_node(self) -> Optional[PersistentNode]:
+        return self.root
+
+    def snapshot(self) -> PersistentTreapMap[KT, VT]:
+        """Return a version that later updates can't affect, in O(1).
+
+        Versions are immutable, so this is the map itself.
+        """
+        return self
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        node = self.root
+        while node is not None:
+            if key == node.key:
+                return node.value
+            node = node.left_child if key < node.key else node.right_child
+        return None
+
+    def __contains__(self, key: KT) -> bool:
+        node = self.root
+        while node is not None:
+            if key == node.key:
+                return True
+            node = node.left_child if key < node.key else node.right_child
+        return False
+
+    def insert(self, key: KT, value: VT) -> PersistentTreapMap[KT, VT]:
+        """Return a new version with `key` mapped to `value`."""
+        if key in self:
+            return self._version(_assign(self.root, key, value))
+        return self._version(_insert(self.root, key, value, self.priorities(key)))
+
+    def remove(self, key: KT) -> PersistentTreapMap[KT, VT]:
+        """Return a new version without `key` (this one if it is absent)."""
+        if key not in self:
+            return self
+        return self._version(_remove(self.root, key))
+
+    def split(self, threshold: KT) -> List[PersistentTreapMap[KT, VT]]:
+        """Return versions holding the keys < `threshold` and >= `threshold`.
+
+        This version is left unchanged.
+        """
+        below, equal, above = _split(self.root, threshold)
+        if equal is not None:
+            above = _merge(PersistentNode(equal.key, equal.value, equal.priority), above)
+        return [self._version(below), self._version(above)]
+
+    def join(self, other: PersistentTreapMap[KT, VT]) -> PersistentTreapMap[KT, VT]:
+        """Return a version holding this map's keys followed by `other`'s.
+
+        Every key in this map must be less than every key in `other`.
+        Neither operand is modified.
+        """
+        return self._version(_merge(self.root, other.root))
+
+    def __len__(self) -> int:
+        return self.root.size if self.root is not None else 0
+
+    def _in_order(self) -> Iterator[PersistentNode]:
+        stack = []
+        node = self.root
+        while True:
+            while node is not None:
+                stack.append(node)
+                node = node.left_child
+            if not stack:
+                return
+            node = stack.pop()
+            yield node
+            node = node.right_child
+
+    def items(self) -> Iterator[Tuple[KT, VT]]:
+        return ((node.key, node.value) for node in self._in_order())
+
+    def __iter__(self) -> Iterator[KT]:
+        return (node.key for node in self._in_order())
@@ -0,0 +1,116 @@
+"""
+Priority sources for treap nodes.
+
+A priority source is a callable that takes the key of a node being created
+and returns its integer priority. Treaps only compare priorities, so any
+source that produces well-spread values keeps them balanced in expectation.
+Priorities are never recycled, so sources have no state tied to removal.
+"""
+
+from __future__ import annotations
+import os
+import random
+import weakref
+from abc import ABC, abstractmethod
+from hashlib import blake2b
+from typing import Any, Optional
+
+_MASK_64 = (1 << 64) - 1
+
+# Unseeded sources are reseeded in forked children so that parent and
+# child don't hand out identical priority streams.
+_unseeded_sources: "weakref.WeakSet[RandomPriority]" = weakref.WeakSet()
+
+
+def _reseed_after_fork() -> None:
+    for source in list(_unseeded_sources):
+        source.reseed()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed_after_fork)
+
+
+class PrioritySource(ABC):
+    """Callable producing a priority for a node with the given key."""
+
+    @abstractmethod
+    def __call__(self, key: Any) -> int:
+        """Return the priority for a new node holding `key`."""
+
+
+class RandomPriority(PrioritySource):
+    """Uniform 64-bit random priorities from a private RNG.
+
+    Drawing from `random.Random.getrandbits` is a single call made under
+    the GIL, so one instance may be shared between threads. A seeded
+    source yields a reproducible treap shape for a given operation order;
+    an unseeded one is seeded from the OS and reseeded after `fork`.
+
+    Args:
+        seed: Optional seed for reproducible priorities.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.seed = seed
+        self._rng = random.Random(seed)
+        if seed is None:
+            _unseeded_sources.add(self)
+
+    def reseed(self) -> None:
+        self._rng.seed(self.seed)
+
+    def __call__(self, key: Any) -> int:
+        return self._rng.getrandbits(64)
+
+    def __getstate__(self) -> dict:
+        return {"seed": self.seed, "rng": self._rng.getstate()}
+
+    def __setstate__(self, state: dict) -> None:
+        self.seed = state["seed"]
+        self._rng = random.Random()
+        if self.seed is None:
+            # Don't replay the sender's stream in another process.
+            _unseeded_sources.add(self)
+        else:
+            self._rng.setstate(state["rng"])
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & _MASK_64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & _MASK_64
+    return x ^ (x >> 31)
+
+
+class HashPriority(PrioritySource):
+    """Deterministic 64-bit priorities derived from the key.
+
+    The same set of keys always produces the same treap shape regardless
+    of insertion order, in every process. Integers are mixed with
+    splitmix64; str and bytes keys, and anything else by its `repr`, are
+    hashed with BLAKE2b (the built-in `hash` is salted per process).
+
+    Args:
+        seed: Salt selecting a different family of shapes.
+    """
+
+    def __init__(self, seed: int = 0) -> None:
+        self.seed = seed
+        self._salt = seed.to_bytes(16, "little", signed=True)
+
+    def __call__(self, key: Any) -> int:
+        if type(key) is int:
+            return _mix64((key + _mix64(self.seed)) & _MASK_64)
+        if isinstance(key, str):
+            data = key.encode("utf-8", "surrogatepass")
+        elif isinstance(key, (bytes, bytearray)):
+            data = bytes(key)
+        else:
+            data = repr(key).encode("utf-8", "surrogatepass")
+        digest = blake2b(data, digest_size=8, salt=self._salt).digest()
+        return int.from_bytes(digest, "little")
+
+
+# Shared by every treap that isn't given its own source.
+default_priority_source: PrioritySource = RandomPriority()
@@ -0,0 +1,258 @@
+"""
+Streaming binary checkpoints for TreapMap.
+
+A checkpoint holds the entries of a treap in key order, each with its
+priority, followed by an offset index:
+
+    header   MAGIC
+    records  priority (u64) | key length (u32) | key | value length (u32) | value
+    index    one u64 file offset per record
+    footer   record count (u64) | index offset (u64) | MAGIC
+
+Keys and values are pickled. Since an in-order sequence plus priorities
+determines a treap, `load` rebuilds the exact same shape in O(n) without
+any rotations (as long as priorities are distinct, which 64-bit random
+priorities are in practice). `MappedTreap` answers lookups straight from
+a memory-mapped checkpoint by binary search over the index, without
+building any nodes.
+"""
+
+from __future__ import annotations
+import mmap
+import pickle
+import struct
+import sys
+from array import array
+from collections.abc import Iterator
+from typing import IO, Any, Iterable, Optional, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.priority import PrioritySource
+from py_treaps.treap_map import TreapMap
+from py_treaps.treap_node import TreapNode
+
+MAGIC = b"PYTREAP1"
+_HEADER = struct.Struct("<Q I")  # priority, key length
+_LENGTH = struct.Struct("<I")
+_FOOTER = struct.Struct("<Q Q 8s")  # count, index offset, magic
+
+# Records are gathered into chunks of about this many bytes per write.
+_CHUNK_SIZE = 1 << 16
+
+
+def _is_priority(priority: Any) -> bool:
+    return isinstance(priority, int) and 0 <= priority < 1 << 64
+
+
+def _priority_error(key: Any, priority: Any) -> ValueError:
+    return ValueError(
+        f"priority {priority!r} of key {key!r} is not an unsigned 64-bit int"
+    )
+
+
+def dump(treap: TreapMap[KT, VT], fp: IO[bytes]) -> int:
+    """Write `treap` to the binary file `fp` as a checkpoint.
+
+    Entries are streamed in key order in bounded chunks, so memory use
+    does not grow with the size of the treap beyond 8 bytes per entry for
+    the offset index.
+
+    Args:
+        treap: The TreapMap to write.
+        fp: A binary file opened for writing.
+
+    Returns:
+        The number of bytes written.
+
+    Raises:
+        ValueError: If a priority is not an int in [0, 2**64), in which
+            case nothing is written.
+    """
+    for node in treap._in_order():
+        if not _is_priority(node.priority):
+            raise _priority_error(node.key, node.priority)
+    return dump_entries(
+        ((node.key, node.value, node.priority) for node in treap._in_order()), fp
+    )
+
+
+def dump_entries(entries: Iterable[Tuple[Any, Any, int]], fp: IO[bytes]) -> int:
+    """Write (key, value, priority) triples in ascending key order to `fp`.
+
+    Returns:
+        The number of bytes written.
+
+    Raises:
+        ValueError: If a priority is not an int in [0, 2**64). The entries
+            are streamed, so `fp` may already hold a partial checkpoint;
+            `dump` checks a treap's priorities before writing anything.
+    """
+    dumps = pickle.dumps
+    protocol = pickle.HIGHEST_PROTOCOL
+    pack_header, pack_length = _HEADER.pack, _LENGTH.pack
+    offsets = array("Q")
+    position = len(MAGIC)
+    chunk = bytearray(MAGIC)
+    for key, value, priority in entries:
+        key_bytes = dumps(key, protocol)
+        value_bytes = dumps(value, protocol)
+        offsets.append(position)
+        start = len(chunk)
+        try:
+            chunk += pack_header(priority, len(key_bytes))
+        except struct.error:
+            raise _priority_error(key, priority) from None
+        chunk += key_bytes
+        chunk += pack_length(len(value_bytes))
+        chunk += value_bytes
+        position += len(chunk) - start
+        if len(chunk) >= _CHUNK_SIZE:
+            fp.write(chunk)
+            chunk = bytearray()
+
+    fp.write(chunk)
+    index_offset = position
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    index = offsets.tobytes()
+    fp.write(index)
+    fp.write(_FOOTER.pack(len(offsets), index_offset, MAGIC))
+    return index_offset + len(index) + _FOOTER.size
+
+
+def iter_entries(fp: IO[bytes]) -> Iterator[Tuple[Any, Any, int]]:
+    """Stream the (key, value, priority) triples of a checkpoint in order.
+
+    Raises:
+        ValueError: If `fp` is not a treap checkpoint.
+    """
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a treap checkpoint")
+    loads = pickle.loads
+    read = fp.read
+    unpack_header, unpack_length = _HEADER.unpack, _LENGTH.unpack
+    header_size, length_size = _HEADER.size, _LENGTH.size
+    # The footer's record count tells where the records stop.
+    position = fp.tell()
+    fp.seek(-_FOOTER.size, 2)
+    count, _, magic = _FOOTER.unpack(fp.read(_FOOTER.size))
+    if magic != MAGIC:
+        raise ValueError("truncated treap checkpoint")
+    fp.seek(position)
+    for _ in range(count):
+        priority, key_length = unpack_header(read(header_size))
+        key = loads(read(key_length))
+        (value_length,) = unpack_length(read(length_size))
+        yield key, loads(read(value_length)), priority
+
+
+def load(fp: IO[bytes], priorities: Optional[PrioritySource] = None) -> TreapMap:
+    """Rebuild the TreapMap written to `fp` by `dump`.
+
+    Nodes get their stored priorities and are linked with the O(n)
+    stack-based build, reproducing the checkpointed shape. The result is
+    always a plain TreapMap, whatever class was dumped: a checkpoint holds
+    only keys, values and priorities, not subclass node data such as
+    aggregates or pending lazy tags. To restore a subclass, rebuild it
+    from the loaded map's items.
+
+    Args:
+        fp: A seekable binary file opened for reading.
+        priorities: Priority source for nodes inserted after loading.
+
+    Raises:
+        ValueError: If `fp` is not a treap checkpoint.
+    """
+    treap: TreapMap = TreapMap(priorities)
+    treap._link_sorted(
+        TreapNode(key, value, None, priority) for key, value, priority in iter_entries(fp)
+    )
+    return treap
+
+
+class MappedTreap:
+    """A read-only view of a checkpoint file backed by `mmap`.
+
+    Lookups binary-search the on-disk index and unpickle only the O(log n)
+    keys they probe. The map's memory is the page cache, shared between
+    processes mapping the same file.
+
+    Args:
+        path: Path to a checkpoint written by `dump`.
+
+    Raises:
+        ValueError: If the file is not a treap checkpoint.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mmap
+        if len(buf) < len(MAGIC) + _FOOTER.size or buf[: len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError("not a treap checkpoint")
+        count, index_offset, magic = _FOOTER.unpack_from(buf, len(buf) - _FOOTER.size)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError("truncated treap checkpoint")
+        self._count = count
+        self._index_offset = index_offset
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> MappedTreap:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _offset(self, i: int) -> int:
+        return struct.unpack_from("<Q", self._mmap, self._index_offset + 8 * i)[0]
+
+    def _read_key(self, offset: int) -> Tuple[Any, int]:
+        # Returns the key at a record and the offset of its value length.
+        _, key_length = _HEADER.unpack_from(self._mmap, offset)
+        start = offset + _HEADER.size
+        end = start + key_length
+        return pickle.loads(self._mmap[start:end]), end
+
+    def _read_value(self, offset: int) -> Any:
+        (value_length,) = _LENGTH.unpack_from(self._mmap, offset)
+        start = offset + _LENGTH.size
+        return pickle.loads(self._mmap[start : start + value_length])
+
+    def _find(self, key: KT) -> int:
+        # Offset of the value length for key's record, or -1 if absent.
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, value_offset = self._read_key(self._offset(mid))
+            if mid_key < key:
+                lo = mid + 1
+            elif key < mid_key:
+                hi = mid
+            else:
+                return value_offset
+        return -1
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        value_offset = self._find(key)
+        return None if value_offset < 0 else self._read_value(value_offset)
+
+    def __contains__(self, key: KT) -> bool:
+        return self._find(key) >= 0
+
+    def items(self) -> Iterator[Tuple[KT, VT]]:
+        offset = len(MAGIC)
+        for _ in range(self._count):
+            key, value_offset = self._read_key(offset)
+            yield key, self._read_value(value_offset)
+            (value_length,) = _LENGTH.unpack_from(self._mmap, value_offset)
+            offset = value_offset + _LENGTH.size + value_length
+
+    def __iter__(self) -> Iterator[KT]:
+        return (key for key, _ in self.items())
@@ -0,0 +1,280 @@
+from __future__ import annotations
+import itertools
+import threading
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import Any, Callable, Generic, List, Optional, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.priority import PrioritySource
+from py_treaps.treap_map import TreapMap
+
+# The most entries iteration copies out of a shard per lock acquisition.
+_CHUNK_SIZE = 1024
+
+
+class _Table:
+    # One routing generation: shard i holds keys in [bounds[i - 1], bounds[i]).
+    # A table is never changed after it is published, except for the write
+    # counters, which are only touched under the matching shard lock.
+
+    __slots__ = ("bounds", "shards", "locks", "writes")
+
+    def __init__(self, bounds: List[Any], shards: List[TreapMap]):
+        self.bounds = bounds
+        self.shards = shards
+        self.locks = [threading.Lock() for _ in shards]
+        self.writes = [0] * len(shards)
+
+
+class ShardedTreapMap(Generic[KT, VT], Iterable):
+    """A thread-safe map over range-partitioned TreapMap shards.
+
+    Each key is routed by binary search over the shard boundaries to one
+    TreapMap, guarded by its own lock, so writers to different key ranges
+    never wait on each other. Iteration visits the shards in key order,
+    which for range-partitioned shards is their merge.
+
+    Boundaries move online. A shard that outgrows `max_shard_size`, or
+    takes more than `hot_fraction` of the writes in a window, is split at
+    its median with `TreapMap.split`; adjacent shards whose combined size
+    falls below a quarter of `max_shard_size` are joined, as are adjacent
+    shards taking under half that fraction of the writes when there is no
+    size limit. A rebalance
+    publishes a new routing table while holding the locks of the shards it
+    replaces, and operations that routed through the old table notice the
+    change once they get the lock and retry.
+
+    Args:
+        bounds: Initial ascending shard boundaries; k bounds give k + 1
+            shards.
+        max_shard_size: Split shards larger than this, or None to never
+            split on size.
+        hot_fraction: Split shards taking more than this fraction of the
+            last `window` writes, or None to ignore write load.
+        window: The number of writes between load checks.
+        priorities: Priority source for every shard.
+    """
+
+    def __init__(
+        self,
+        bounds: Iterable[KT] = (),
+        max_shard_size: Optional[int] = None,
+        hot_fraction: Optional[float] = None,
+        window: int = 10000,
+        priorities: Optional[PrioritySource] = None,
+    ):
+        bounds = list(bounds)
+        if any(not a < b for a, b in zip(bounds, bounds[1:])):
+            raise ValueError("shard bounds must be strictly ascending")
+        self.priorities = priorities
+        self.max_shard_size = max_shard_size
+        self.hot_fraction = hot_fraction
+        self.window = window
+        self._table = _Table(
+            bounds, [TreapMap(priorities) for _ in range(len(bounds) + 1)]
+        )
+        self._rebalance_lock = threading.Lock()
+        self._write_count = itertools.count(1)
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Tuple[KT, VT]],
+        shards: int,
+        max_shard_size: Optional[int] = None,
+        hot_fraction: Optional[float] = None,
+        window: int = 10000,
+        priorities: Optional[PrioritySource] = None,
+    ) -> ShardedTreapMap[KT, VT]:
+        """Build a map with up to `shards` equally sized shards, in O(n log n).
+
+        The pairs are built into one TreapMap, whose order statistics pick
+        the boundaries it is then split at.
+        """
+        treap = TreapMap.from_items(items, priorities)
+        n = len(treap)
+        bounds: List[KT] = []
+        for i in range(1, shards):
+            index = i * n // shards
+            if index > 0:
+                key = treap.select(index)
+                if not bounds or bounds[-1] < key:
+                    bounds.append(key)
+        sharded = cls(bounds, max_shard_size, hot_fraction, window, priorities)
+        pieces = []
+        rest = treap
+        for bound in bounds:
+            below, rest = rest.split(bound)
+            pieces.append(below)
+        pieces.append(rest)
+        sharded._table = _Table(bounds, pieces)
+        return sharded
+
+    def _locked(self, key: KT) -> Tuple[_Table, int]:
+        # Lock the shard for key in the current table. Returns the table
+        # and shard index; the caller must release table.locks[index].
+        while True:
+            table = self._table
+            index = bisect_right(table.bounds, key)
+            table.locks[index].acquire()
+            if table is self._table:
+                return table, index
+            table.locks[index].release()
+
+    def _read(self, key: KT, fn: Callable[[TreapMap], Any]) -> Any:
+        table, index = self._locked(key)
+        try:
+            return fn(table.shards[index])
+        finally:
+            table.locks[index].release()
+
+    def _write(self, key: KT, fn: Callable[[TreapMap], Any]) -> Any:
+        table, index = self._locked(key)
+        try:
+            result = fn(table.shards[index])
+            table.writes[index] += 1
+            oversized = (
+                self.max_shard_size is not None
+                and len(table.shards[index]) > self.max_shard_size
+            )
+        finally:
+            table.locks[index].release()
+        if oversized or next(self._write_count) % self.window == 0:
+            self.rebalance()
+        return result
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        return self._read(key, lambda shard: shard.lookup(key))
+
+    def __contains__(self, key: KT) -> bool:
+        return self._read(key, lambda shard: shard.locate(key) is not None)
+
+    def insert(self, key: KT, value: VT) -> None:
+        self._write(key, lambda shard: shard.insert(key, value))
+
+    def remove(self, key: KT) -> Optional[VT]:
+        return self._write(key, lambda shard: shard.remove(key))
+
+    def __len__(self) -> int:
+        # Shard sizes are read one at a time, so concurrent writes may or
+        # may not be counted.
+        return sum(len(shard) for shard in self._table.shards)
+
+    def shard_sizes(self) -> List[int]:
+        """Return the number of entries in each shard, in key order."""
+        return [len(shard) for shard in self._table.shards]
+
+    def shard_bounds(self) -> List[KT]:
+        """Return the current shard boundaries."""
+        return list(self._table.bounds)
+
+    def rebalance(self) -> None:
+        """Split oversized or hot shards and join small neighbours.
+
+        Runs automatically from `insert` and `remove`; call it directly to
+        rebalance after a bulk load. Concurrent calls run one at a time.
+        """
+        with self._rebalance_lock:
+            table = self._table
+            for lock in table.locks:
+                lock.acquire()
+            try:
+                self._table = self._rebalanced(table)
+            finally:
+                for lock in table.locks:
+                    lock.release()
+
+    def _rebalanced(self, table: _Table) -> _Table:
+        # Holding every lock of table, build the next table from its
+        # shards. Unchanged shards are reused as they are.
+        total_writes = sum(table.writes)
+        hot_limit = (
+            self.hot_fraction * total_writes
+            if self.hot_fraction is not None and total_writes >= self.window
+            else None
+        )
+        size_limit = self.max_shard_size
+
+        bounds: List[Any] = []
+        shards: List[TreapMap] = []
+        # Writes per new shard; the halves of a split get half each, so
+        # the halves of a hot shard are not joined straight back.
+        writes: List[float] = []
+        for i, shard in enumerate(table.shards):
+            if i > 0:
+                bounds.append(table.bounds[i - 1])
+            shard_writes = table.writes[i]
+            too_large = size_limit is not None and len(shard) > size_limit
+            too_hot = hot_limit is not None and shard_writes > hot_limit
+            if (too_large or too_hot) and len(shard) >= 2:
+                median = shard.select(len(shard) // 2)
+                below, above = shard.split(median)
+                shards += [below, above]
+                bounds.append(median)
+                writes += [shard_writes / 2, shard_writes / 2]
+            elif shards and self._joinable(
+                len(shards[-1]) + len(shard), writes[-1] + shard_writes, hot_limit
+            ):
+                bounds.pop()
+                shards[-1].join(shard)
+                writes[-1] += shard_writes
+            else:
+                shards.append(shard)
+                writes.append(shard_writes)
+        if shards == table.shards and hot_limit is None:
+            # Nothing moved and the write window is still open.
+            return table
+        return _Table(bounds, shards)
+
+    def _joinable(self, size: int, writes: float, hot_limit: Optional[float]) -> bool:
+        # Whether two neighbours with this combined size and write count
+        # should be one shard. Without a size limit, cold neighbours are
+        # joined so that splitting hot spots can't grow the shard count
+        # without bound as the hot spots move.
+        cold = hot_limit is not None and writes < hot_limit / 2
+        if self.max_shard_size is None:
+            return cold
+        return size < self.max_shard_size // 4 and (hot_limit is None or cold)
+
+    def _range_items(self, lo: Optional[KT], hi: Optional[KT]) -> Iterator[Tuple[KT, VT]]:
+        # Up to _CHUNK_SIZE entries of a shard's part of the range are
+        # copied under its lock and then yielded, so no lock is held between
+        # items or for longer than one chunk. The next chunk is found by key
+        # in the current table, so rebalancing mid-walk is safe.
+        cursor, inclusive = lo, True
+        while True:
+            table = self._table
+            index = 0 if cursor is None else bisect_right(table.bounds, cursor)
+            with table.locks[index]:
+                if table is not self._table:
+                    continue
+                nodes = table.shards[index]._range_nodes(cursor, hi, (inclusive, True), False)
+                chunk = [(node.key, node.value) for node in islice(nodes, _CHUNK_SIZE)]
+                upper = table.bounds[index] if index < len(table.bounds) else None
+            yield from chunk
+            if len(chunk) == _CHUNK_SIZE:
+                # The shard may hold more of the range; resume after the
+                # last key under a fresh lock.
+                cursor, inclusive = chunk[-1][0], False
+                continue
+            if upper is None or (hi is not None and hi < upper):
+                return
+            # Everything below upper has been seen.
+            cursor, inclusive = upper, True
+
+    def irange(self, lo: Optional[KT] = None, hi: Optional[KT] = None) -> Iterator[KT]:
+        """Return an iterator over the keys with `lo <= key <= hi`, in order.
+
+        Shards are read in chunks of at most 1024 entries, each copied
+        under its shard's lock as of the moment it is reached, so the walk
+        never blocks writers for long.
+        """
+        return (key for key, _ in self._range_items(lo, hi))
+
+    def items(self) -> Iterator[Tuple[KT, VT]]:
+        return self._range_items(None, None)
+
+    def __iter__(self) -> Iterator[KT]:
+        return self.irange()
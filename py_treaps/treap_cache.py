@@ -0,0 +1,190 @@
+from __future__ import annotations
+import itertools
+import math
+import time
+from collections.abc import Iterator
+from typing import Any, Callable, Dict, Generic, Optional, Tuple
+
+from py_treaps.comparable import KT, VT
+from py_treaps.priority import PrioritySource
+from py_treaps.treap_map import TreapMap
+
+
+class _Entry:
+    # A cached value with its keys in the deadline and recency treaps.
+
+    __slots__ = ("value", "deadline", "tick")
+
+    def __init__(self, value: Any, deadline: Optional[Tuple[float, int]], tick: int):
+        self.value = value
+        self.deadline = deadline
+        self.tick = tick
+
+
+class TreapCache(Generic[KT, VT]):
+    """A bounded cache with per-entry TTLs and least-recently-used eviction.
+
+    Three TreapMaps are kept in step. `entries` maps each key to its
+    value; `deadlines` maps (expiry time, sequence number) to the key of
+    every entry with a TTL; and `recency` maps a use counter to the key
+    of every entry. Expired entries are found by splitting `deadlines` at
+    the current time, so dropping the k expired entries costs
+    O(k log n), and the least recently used entry is the minimum of
+    `recency`, popped in O(log n). No operation scans the whole cache.
+
+    Expired entries are dropped by every `put` and `expire` call, and
+    never returned by `get`. Not thread-safe.
+
+    Args:
+        capacity: The maximum number of entries, or None for no bound.
+        ttl: The default time to live in seconds, or None for no expiry.
+        clock: Returns the current time in seconds (default:
+            `time.monotonic`).
+        priorities: Priority source for the underlying treaps.
+
+    Attributes:
+        hits: Calls to `get` that found a live entry.
+        misses: Calls to `get` that did not.
+        evictions: Entries dropped to stay within `capacity`.
+        expirations: Entries dropped because their TTL ran out.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        priorities: Optional[PrioritySource] = None,
+    ):
+        if capacity is not None and capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: TreapMap[KT, _Entry] = TreapMap(priorities)
+        self.deadlines: TreapMap[Tuple[float, int], KT] = TreapMap(priorities)
+        self.recency: TreapMap[int, KT] = TreapMap(priorities)
+        # Ticks order uses; sequence numbers keep equal deadlines distinct.
+        self._ticks = itertools.count()
+        self._sequence = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, entry: _Entry) -> bool:
+        return entry.deadline is None or self.clock() < entry.deadline[0]
+
+    def _drop(self, key: KT) -> _Entry:
+        # Remove key from all three treaps and return its entry.
+        entry = self.entries.remove(key)
+        self.recency.remove(entry.tick)
+        if entry.deadline is not None:
+            self.deadlines.remove(entry.deadline)
+        return entry
+
+    def get(self, key: KT, default: Any = None) -> Any:
+        """Return the value cached for `key`, or `default`, marking it used.
+
+        An entry whose TTL has run out counts as a miss and is dropped.
+        """
+        entry = self.entries.lookup(key)
+        if entry is not None and not self._live(entry):
+            self._drop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.recency.remove(entry.tick)
+        entry.tick = next(self._ticks)
+        self.recency.append(entry.tick, key)
+        return entry.value
+
+    def put(self, key: KT, value: VT, ttl: Optional[float] = None) -> None:
+        """Cache `value` for `key`, replacing any previous entry.
+
+        Drops the expired entries first, then the least recently used ones
+        while the cache is over capacity.
+
+        Args:
+            key: The key to cache under.
+            value: The value to cache.
+            ttl: Seconds until the entry expires; defaults to the cache's
+                `ttl`. `math.inf`, or None with no default, means the entry
+                never expires.
+        """
+        now = self.clock()
+        self.expire(now)
+        if ttl is None:
+            ttl = self.ttl
+        if self.entries.lookup(key) is not None:
+            self._drop(key)
+        deadline = None
+        if ttl is not None and ttl < math.inf:
+            deadline = (now + ttl, next(self._sequence))
+            self.deadlines.insert(deadline, key)
+        entry = _Entry(value, deadline, next(self._ticks))
+        self.recency.append(entry.tick, key)
+        self.entries.insert(key, entry)
+        if self.capacity is not None:
+            while len(self.entries) > self.capacity:
+                _, oldest = self.recency.peek_min()
+                self._drop(oldest)
+                self.evictions += 1
+
+    def pop(self, key: KT, default: Any = None) -> Any:
+        """Remove `key` and return its value, or `default` if not cached."""
+        if self.entries.lookup(key) is None:
+            return default
+        return self._drop(key).value
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop every entry whose deadline is at or before `now`.
+
+        Checks the earliest deadline in O(1). If it has passed, splits the
+        deadline treap at `now` in O(log n) and removes the k expired
+        entries in O(k log n).
+
+        Args:
+            now: The current time; defaults to `clock()`.
+
+        Returns:
+            The number of entries dropped.
+        """
+        if now is None:
+            now = self.clock()
+        # The earliest deadline is cached, so most calls stop here in O(1).
+        first = self.deadlines.peek_min()
+        if first is None or now < first[0][0]:
+            return 0
+        expired, self.deadlines = self.deadlines.split((now, math.inf))
+        for key in expired.values():
+            entry = self.entries.remove(key)
+            self.recency.remove(entry.tick)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the size and the hit, miss, eviction and expiry counters."""
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __contains__(self, key: KT) -> bool:
+        # Doesn't count as a use or touch the counters.
+        entry = self.entries.lookup(key)
+        return entry is not None and self._live(entry)
+
+    def __len__(self) -> int:
+        # Includes expired entries that have not been dropped yet.
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[KT]:
+        # Keys in order, like len() including undropped expired entries.
+        return iter(self.entries)
@@ -8,6 +8,12 @@ from py_treaps.comparable import KT, VT
 
 class TreapNode:
 
+    # Nodes are allocated once per entry; slots drop the per-instance
+    # __dict__, which is larger than the six attributes themselves.
+    __slots__ = (
+        "key", "value", "priority", "parent", "left_child", "right_child", "size"
+    )
+
     unused_priorities: Optional[List[int]] = None
 
     # The maximum priority that a node can have.
@@ -28,18 +34,26 @@ class TreapNode:
         parent (TreapNode): The parent of the node.
         left_child (TreapNode): The left child of the node.
         right_child (TreapNode): The right child of the node.
+        size (int): The number of nodes in the subtree rooted here.
     """
 
     def __init__(
-        self, key: KT, value: VT, parent: Optional[TreapNode] = None
+        self,
+        key: KT,
+        value: VT,
+        parent: Optional[TreapNode] = None,
+        priority: Optional[int] = None,
     ):
         self.key: KT = key
         self.value: VT = value
-        self.priority: int = self.get_priority()
+        # Treaps pass a priority from their PrioritySource; the shuffled
+        # pool below is only used by nodes created without one.
+        self.priority: int = self.get_priority() if priority is None else priority
 
         self.parent: Optional[TreapNode] = parent
         self.left_child: Optional[TreapNode] = None
         self.right_child: Optional[TreapNode] = None
+        self.size: int = 1
 
     def get_priority(self):
         """Generate a new priority for a treap node.
@@ -0,0 +1,233 @@
+from __future__ import annotations
+import itertools
+from collections.abc import Iterable, Iterator
+from typing import Any, Generic, Optional, Tuple, TypeVar, Union
+
+from py_treaps.priority import PrioritySource, default_priority_source
+from py_treaps.treap_map import _link_nodes, _merge_spines, _split_path
+from py_treaps.treap_node import TreapNode
+
+T = TypeVar("T")
+
+# Node ids, unique across sequences so that sequences built with the
+# same key-hashing priority source don't share priorities when concatenated.
+_node_ids = itertools.count(1)
+
+
+class SequenceNode(TreapNode):
+    """A TreapNode keyed implicitly by its position.
+
+    The element is stored as the node's value and its key is unused.
+
+    Attributes:
+        reverse_pending (bool): Whether this node's subtree still has to
+            be mirrored; pushed down to the children on the next visit.
+    """
+
+    __slots__ = ("reverse_pending",)
+
+    def __init__(self, value: Any, priority: int):
+        super().__init__(None, value, None, priority)
+        self.reverse_pending: bool = False
+
+
+def _size(node: Optional[TreapNode]) -> int:
+    return node.size if node is not None else 0
+
+
+class TreapSequence(Generic[T], Iterable):
+    """A mutable sequence stored as a treap keyed by implicit position.
+
+    A node's position is the number of elements before it, read from
+    subtree sizes, so positional split and merge take O(log n) expected
+    time. On top of them `insert_at`, `delete_at`, `cut`, `concat` and
+    `reverse_range` are O(log n); reversal is applied lazily.
+
+    Args:
+        iterable: Initial elements, built in O(n).
+        priorities: Priority source for new nodes. Each node's priority
+            is drawn with an integer id unique within the process as the
+            key, so even a `HashPriority` gives every node its own priority.
+    """
+
+    def __init__(
+        self, iterable: Iterable[T] = (), priorities: Optional[PrioritySource] = None
+    ):
+        self.root: Optional[SequenceNode] = None
+        self.priorities: PrioritySource = (
+            default_priority_source if priorities is None else priorities
+        )
+        self.root = self._build(iterable)
+
+    def _new_node(self, value: T) -> SequenceNode:
+        return SequenceNode(value, self.priorities(next(_node_ids)))
+
+    def _build(self, values: Iterable[T]) -> Optional[SequenceNode]:
+        # Positions ascend in iteration order, so this is TreapMap's build.
+        return _link_nodes(map(self._new_node, values), self._update)
+
+    def _update(self, node: TreapNode) -> None:
+        node.size = 1 + _size(node.left_child) + _size(node.right_child)
+
+    def _push(self, node: SequenceNode) -> None:
+        # Apply a pending reversal to node and hand it on to its children.
+        if node.reverse_pending:
+            node.reverse_pending = False
+            node.left_child, node.right_child = node.right_child, node.left_child
+            for child in (node.left_child, node.right_child):
+                if child is not None:
+                    child.reverse_pending = not child.reverse_pending
+
+    def _split(
+        self, node: Optional[SequenceNode], index: int
+    ) -> Tuple[Optional[SequenceNode], Optional[SequenceNode]]:
+        # Split off the first `index` elements, walking down a single path.
+        remaining = index
+
+        def goes_left(node: SequenceNode) -> bool:
+            # Settle the reversal first: it decides which child is left.
+            nonlocal remaining
+            self._push(node)
+            left_size = _size(node.left_child)
+            if left_size < remaining:
+                remaining -= left_size + 1
+                return True
+            return False
+
+        return _split_path(node, self._update, goes_left=goes_left)
+
+    def _merge(
+        self, a: Optional[SequenceNode], b: Optional[SequenceNode]
+    ) -> Optional[SequenceNode]:
+        return _merge_spines(a, b, self._update, self._push)
+
+    def _index(self, index: int) -> int:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("TreapSequence index out of range")
+        return index
+
+    def _clamp(self, start: Optional[int], stop: Optional[int]) -> Tuple[int, int]:
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return start, max(start, stop)
+
+    def _three_way(
+        self, start: int, stop: int
+    ) -> Tuple[Optional[SequenceNode], Optional[SequenceNode], Optional[SequenceNode]]:
+        # Detach [start, stop) from the sequence, returning all three parts.
+        rest, after = self._split(self.root, stop)
+        before, middle = self._split(rest, start)
+        self.root = None
+        return before, middle, after
+
+    def _node_at(self, index: int) -> SequenceNode:
+        node = self.root
+        while True:
+            self._push(node)
+            left_size = _size(node.left_child)
+            if index < left_size:
+                node = node.left_child
+            elif index == left_size:
+                return node
+            else:
+                index -= left_size + 1
+                node = node.right_child
+
+    def __len__(self) -> int:
+        return _size(self.root)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                return list(self)[index]
+            start, stop = self._clamp(index.start, index.stop)
+            return list(self._iter_range(start, stop))
+        return self._node_at(self._index(index)).value
+
+    def __setitem__(self, index: int, value: T) -> None:
+        self._node_at(self._index(index)).value = value
+
+    def insert_at(self, index: int, value: T) -> None:
+        """Insert `value` before position `index`, in O(log n)."""
+        index = min(max(index + len(self) if index < 0 else index, 0), len(self))
+        before, after = self._split(self.root, index)
+        self.root = self._merge(self._merge(before, self._new_node(value)), after)
+
+    def append(self, value: T) -> None:
+        self.root = self._merge(self.root, self._new_node(value))
+
+    def delete_at(self, index: int) -> T:
+        """Remove and return the element at position `index`, in O(log n).
+
+        Raises:
+            IndexError: If `index` is out of range.
+        """
+        index = self._index(index)
+        before, middle, after = self._three_way(index, index + 1)
+        self.root = self._merge(before, after)
+        return middle.value
+
+    def cut(self, start: Optional[int] = None, stop: Optional[int] = None) -> TreapSequence[T]:
+        """Remove the elements in [start, stop) and return them, in O(log n).
+
+        Indices follow slice rules.
+        """
+        start, stop = self._clamp(start, stop)
+        before, middle, after = self._three_way(start, stop)
+        self.root = self._merge(before, after)
+        piece = TreapSequence(priorities=self.priorities)
+        piece.root = middle
+        return piece
+
+    def concat(self, other: TreapSequence[T]) -> None:
+        """Append every element of `other`, in O(log n). Empties `other`."""
+        root, other.root = other.root, None
+        self.root = self._merge(self.root, root)
+
+    def reverse_range(self, start: Optional[int] = None, stop: Optional[int] = None) -> None:
+        """Reverse the elements in [start, stop) in place, in O(log n).
+
+        The reversal is recorded on one subtree root and applied to its
+        descendants lazily as later operations walk through them.
+        """
+        start, stop = self._clamp(start, stop)
+        before, middle, after = self._three_way(start, stop)
+        if middle is not None:
+            middle.reverse_pending = not middle.reverse_pending
+        self.root = self._merge(self._merge(before, middle), after)
+
+    def _iter_range(self, start: int, stop: int) -> Iterator[T]:
+        # In-order walk from position start, pushing reversals on the way.
+        remaining = stop - start
+        stack = []
+        node = self.root
+        index = start
+        while node is not None:
+            self._push(node)
+            left_size = _size(node.left_child)
+            if index < left_size:
+                stack.append(node)
+                node = node.left_child
+            elif index == left_size:
+                stack.append(node)
+                break
+            else:
+                index -= left_size + 1
+                node = node.right_child
+        while stack and remaining > 0:
+            node = stack.pop()
+            yield node.value
+            remaining -= 1
+            node = node.right_child
+            while node is not None:
+                self._push(node)
+                stack.append(node)
+                node = node.left_child
+
+    def __iter__(self) -> Iterator[T]:
+        return self._iter_range(0, len(self))
+
+    def __repr__(self) -> str:
+        return f"TreapSequence({list(self)!r})"
@@ -0,0 +1,468 @@
+"""
+Write-ahead logging for TreapMap.
+
+A DurableTreapMap keeps its state in a directory as a checkpoint plus the
+log segments written since:
+
+    snapshot-<g>.ckpt   the state before log segment g, in the format of
+                        `py_treaps.serialization`
+    log-<g>.wal         records for the changes made after it, each framed
+                        as length (u32) | CRC-32 (u32) | pickled operation
+
+Recovery loads the newest snapshot and replays the segments from its
+generation on. A record that is cut short or fails its checksum ends the
+replay if it is in the newest segment, since there it can only be the
+tail of an interrupted write. Older segments were complete when the log
+moved on, so a bad record in one means the file is damaged, and recovery
+raises ValueError rather than replay later segments over the gap.
+
+Changes are applied in memory and appended to a buffer; `commit` writes
+the buffer and fsyncs once for every change made before it (group
+commit), either when called or every `commit_interval` seconds from a
+background thread. Compaction rotates to a new segment and then folds
+the old snapshot and segments into a new snapshot in a background
+thread, from the files alone, so writers only wait for the rotation.
+"""
+
+from __future__ import annotations
+import os
+import pickle
+import re
+import struct
+import threading
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import Any, Generic, List, Optional, Tuple
+
+from py_treaps import serialization
+from py_treaps.comparable import KT, VT
+from py_treaps.priority import PrioritySource
+from py_treaps.treap_map import TreapMap, prefer_other
+
+_RECORD = struct.Struct("<I I")  # payload length, CRC-32 of payload
+_FILE = re.compile(r"(snapshot|log)-(\d{8})\.(ckpt|wal)$")
+
+# Operation codes of log records.
+INSERT, REMOVE, SPLIT, JOIN = range(4)
+
+# Marks a removed key in a replay batch.
+_REMOVED = object()
+
+
+def _snapshot_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"snapshot-{generation:08d}.ckpt")
+
+
+def _log_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"log-{generation:08d}.wal")
+
+
+def _fsync_directory(directory: str) -> None:
+    # Make file creations and renames durable. Not every platform allows
+    # opening a directory; there the rename is as durable as it gets.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _generations(directory: str) -> Tuple[List[int], List[int]]:
+    # The generations of the snapshots and log segments in directory.
+    snapshots, logs = [], []
+    for name in os.listdir(directory):
+        match = _FILE.match(name)
+        if match:
+            (snapshots if match.group(1) == "snapshot" else logs).append(int(match.group(2)))
+    return sorted(snapshots), sorted(logs)
+
+
+def read_log(path: str) -> Tuple[List[Tuple[Any, ...]], int]:
+    """Read the operations of a log segment.
+
+    Returns:
+        The operations in order, and the length of the valid prefix of
+        the file, which ends before any torn or corrupt record.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    operations = []
+    loads, crc32 = pickle.loads, zlib.crc32
+    unpack_from, header_size = _RECORD.unpack_from, _RECORD.size
+    position = 0
+    while position + header_size <= len(data):
+        length, checksum = unpack_from(data, position)
+        start = position + header_size
+        payload = data[start : start + length]
+        if len(payload) < length or crc32(payload) != checksum:
+            break
+        operations.append(loads(payload))
+        position = start + length
+    return operations, position
+
+
+def _read_segment(directory: str, generation: int, newest: bool) -> List[Tuple[Any, ...]]:
+    # Only the newest segment may end in a torn record.
+    path = _log_path(directory, generation)
+    operations, valid = read_log(path)
+    if not newest and valid < os.path.getsize(path):
+        raise ValueError(f"corrupt record in {path}, which is not the newest log segment")
+    return operations
+
+
+def replay(treap: TreapMap[KT, VT], operations: Iterable[Tuple[Any, ...]]) -> TreapMap[KT, VT]:
+    """Apply logged operations to `treap` in batches and return the result.
+
+    Each run of inserts and removes is stable-sorted by key, keeping the
+    last operation per key, and applied with one `meld` and one
+    `difference`, in O(b log b + b log(n/b + 1)) for b records instead of
+    b separate updates. Splits and joins end a run and are applied as
+    they come. The result replaces `treap`, which a split leaves empty.
+    """
+    batch: List[Tuple[Any, Any]] = []
+
+    def flush(treap: TreapMap[KT, VT]) -> None:
+        if not batch:
+            return
+        # The stable sort keeps the last operation for each key.
+        latest = TreapMap.from_items(batch)
+        upserts, removed = [], []
+        for key, value in latest.items():
+            if value is _REMOVED:
+                removed.append((key, None))
+            else:
+                upserts.append((key, value))
+        treap.difference(TreapMap.from_sorted(removed))
+        treap.meld(TreapMap.from_sorted(upserts, treap.priorities), prefer_other)
+        batch.clear()
+
+    for operation in operations:
+        code = operation[0]
+        if code == INSERT:
+            batch.append((operation[1], operation[2]))
+        elif code == REMOVE:
+            batch.append((operation[1], _REMOVED))
+        else:
+            flush(treap)
+            if code == SPLIT:
+                treap = treap.split(operation[1])[0]
+            elif code == JOIN:
+                treap.join(TreapMap.from_sorted(operation[1], treap.priorities))
+            else:
+                raise ValueError(f"unknown log operation {code!r}")
+    flush(treap)
+    return treap
+
+
+def recover(
+    directory: str, priorities: Optional[PrioritySource] = None
+) -> Tuple[TreapMap, int]:
+    """Rebuild the state stored in `directory`.
+
+    Returns:
+        The TreapMap, and the generation of the newest log segment (0 if
+        there is none).
+
+    Raises:
+        ValueError: If a log segment other than the newest is corrupt.
+    """
+    snapshots, logs = _generations(directory)
+    base = snapshots[-1] if snapshots else 0
+    if snapshots:
+        with open(_snapshot_path(directory, base), "rb") as f:
+            treap = serialization.load(f, priorities)
+    else:
+        treap = TreapMap(priorities)
+    for generation in logs:
+        if generation >= base:
+            operations = _read_segment(directory, generation, generation == logs[-1])
+            treap = replay(treap, operations)
+    return treap, max(logs[-1] if logs else 0, base)
+
+
+class DurableTreapMap(Generic[KT, VT], Iterable):
+    """A thread-safe TreapMap whose changes are written ahead to a log.
+
+    Writers apply a change in memory and append its log record to a
+    buffer, which is fast and never waits for the disk. `commit` makes
+    every change made before it durable with one write and one fsync;
+    callers that commit concurrently share the fsync of whichever commit
+    runs first. With a `commit_interval`, a background thread commits that
+    often, bounding the changes a crash can lose to that window.
+
+    Once the current log segment exceeds `compact_bytes`, the next commit
+    starts a new segment and a background thread writes a new snapshot,
+    so recovery never replays more than about one or two segments.
+
+    Args:
+        directory: Where the snapshots and log segments are kept; created
+            if missing. An existing state there is recovered.
+        priorities: Priority source for the in-memory treap.
+        commit_interval: Seconds between background commits, or None to
+            commit only when `commit` or `close` is called.
+        compact_bytes: Log segment size that triggers compaction, or None
+            to compact only when `compact` is called.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        priorities: Optional[PrioritySource] = None,
+        commit_interval: Optional[float] = 0.01,
+        compact_bytes: Optional[int] = 64 << 20,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compact_bytes = compact_bytes
+        self._treap, self._generation = recover(directory, priorities)
+        # Drop a torn tail so that new records follow the last valid one.
+        path = _log_path(directory, self._generation)
+        valid = read_log(path)[1] if os.path.exists(path) else 0
+        self._log = open(path, "ab")
+        self._log.truncate(valid)
+        self._log_size = valid
+        _fsync_directory(directory)
+
+        # _lock guards the treap and the buffer; _io_lock serializes the
+        # log writes, fsyncs and rotations, in buffer order.
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._buffer = bytearray()
+        self._sequence = 0  # records appended so far
+        self._durable = 0  # records known to be on disk
+        self._compactor: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        self._closed = False  # set under _lock by close
+        self._stopping = threading.Event()
+        self._committer: Optional[threading.Thread] = None
+        if commit_interval is not None:
+            self._committer = threading.Thread(
+                target=self._commit_periodically, args=(commit_interval,), daemon=True
+            )
+            self._committer.start()
+
+    def _append(self, operation: Tuple[Any, ...]) -> None:
+        # Frame a record for the buffer; the caller holds _lock, so records
+        # are buffered in the order their changes were applied.
+        payload = pickle.dumps(operation, pickle.HIGHEST_PROTOCOL)
+        self._buffer += _RECORD.pack(len(payload), zlib.crc32(payload))
+        self._buffer += payload
+        self._sequence += 1
+
+    @property
+    def closed(self) -> bool:
+        """Whether `close` has been called."""
+        return self._closed
+
+    def _check_open(self) -> None:
+        # Called with _lock held, so no change slips in after close commits.
+        if self._closed:
+            raise ValueError("operation on closed DurableTreapMap")
+
+    def lookup(self, key: KT) -> Optional[VT]:
+        with self._lock:
+            return self._treap.lookup(key)
+
+    def __contains__(self, key: KT) -> bool:
+        with self._lock:
+            return self._treap.locate(key) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._treap)
+
+    def insert(self, key: KT, value: VT) -> None:
+        with self._lock:
+            self._check_open()
+            self._treap.insert(key, value)
+            self._append((INSERT, key, value))
+
+    def remove(self, key: KT) -> Optional[VT]:
+        with self._lock:
+            self._check_open()
+            value = self._treap.remove(key)
+            self._append((REMOVE, key))
+            return value
+
+    def split(self, threshold: KT) -> TreapMap[KT, VT]:
+        """Remove the keys >= `threshold` and return them as a TreapMap."""
+        with self._lock:
+            self._check_open()
+            self._treap, upper = self._treap.split(threshold)
+            self._append((SPLIT, threshold))
+            return upper
+
+    def join(self, other: TreapMap[KT, VT]) -> None:
+        """Move every entry of `other` in; its keys must all be larger.
+
+        The entries are written to the log, so this costs O(m) in the
+        size of `other` on top of the O(log n) join.
+
+        Raises:
+            ValueError: If a key of `other` is not larger than every key
+                in this map, or the map is closed.
+        """
+        items = list(other.items())
+        with self._lock:
+            self._check_open()
+            last = self._treap.peek_max()
+            if items and last is not None and not last[0] < items[0][0]:
+                raise ValueError("join keys must be larger than every key in the map")
+            self._treap.join(other)
+            self._append((JOIN, items))
+
+    def items(self) -> Iterator[Tuple[KT, VT]]:
+        # Copied in chunks under the lock, each seeking past the last key,
+        # so iteration never holds writers up for long.
+        last = None
+        while True:
+            with self._lock:
+                nodes = self._treap._range_nodes(last, None, (False, True), False)
+                chunk = [(node.key, node.value) for _, node in zip(range(1024), nodes)]
+            yield from chunk
+            if len(chunk) < 1024:
+                return
+            last = chunk[-1][0]
+
+    def __iter__(self) -> Iterator[KT]:
+        return (key for key, _ in self.items())
+
+    def commit(self) -> None:
+        """Block until every change made before this call is durable.
+
+        Raises:
+            OSError: If writing the log failed, here or in the background.
+            ValueError: If the map is closed.
+        """
+        with self._lock:
+            self._check_open()
+        self._commit()
+
+    def _commit(self) -> None:
+        self._raise_background_error()
+        with self._lock:
+            target = self._sequence
+        with self._io_lock:
+            if self._durable >= target:
+                # A concurrent commit already covered these records.
+                return
+            with self._lock:
+                data, self._buffer = self._buffer, bytearray()
+                sequence = self._sequence
+            if data:
+                self._log.write(data)
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log_size += len(data)
+            self._durable = sequence
+            if self.compact_bytes is not None and self._log_size > self.compact_bytes:
+                self._start_compaction()
+
+    def compact(self, wait: bool = False) -> None:
+        """Start a new log segment and fold the old ones into a snapshot.
+
+        Commits first. The snapshot is written by a background thread; if
+        one is still running, this does nothing.
+
+        Args:
+            wait: Block until the snapshot is written.
+
+        Raises:
+            ValueError: If the map is closed.
+        """
+        self.commit()
+        with self._io_lock:
+            self._start_compaction()
+        if wait:
+            self._wait_for_compaction()
+
+    def _start_compaction(self) -> None:
+        # Called with _io_lock held and the buffer committed.
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        generation = self._generation
+        self._generation += 1
+        self._log.close()
+        self._log = open(_log_path(self.directory, self._generation), "ab")
+        self._log_size = 0
+        _fsync_directory(self.directory)
+        self._compactor = threading.Thread(target=self._compact, args=(generation,), daemon=True)
+        self._compactor.start()
+
+    def _compact(self, generation: int) -> None:
+        # Write snapshot generation + 1 from the files of generations up to
+        # generation, which are closed, and delete what it supersedes.
+        try:
+            snapshots, logs = _generations(self.directory)
+            base = snapshots[-1] if snapshots else 0
+            if snapshots:
+                with open(_snapshot_path(self.directory, base), "rb") as f:
+                    treap = serialization.load(f)
+            else:
+                treap = TreapMap()
+            # The segments up to generation are closed, so none may be torn.
+            for log in logs:
+                if base <= log <= generation:
+                    treap = replay(treap, _read_segment(self.directory, log, False))
+
+            path = _snapshot_path(self.directory, generation + 1)
+            with open(path + ".tmp", "wb") as f:
+                serialization.dump(treap, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            _fsync_directory(self.directory)
+
+            for old in snapshots:
+                os.remove(_snapshot_path(self.directory, old))
+            for log in logs:
+                if log <= generation:
+                    os.remove(_log_path(self.directory, log))
+        except BaseException as e:
+            self._error = e
+
+    def _wait_for_compaction(self) -> None:
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        self._raise_background_error()
+
+    def _raise_background_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _commit_periodically(self, interval: float) -> None:
+        while not self._stopping.wait(interval):
+            try:
+                self._commit()
+            except BaseException as e:
+                self._error = e
+                return
+
+    def close(self) -> None:
+        """Commit, stop the background threads and close the log.
+
+        Later changes, commits and compactions raise ValueError, as for a
+        closed file; the in-memory state can still be read. Calling
+        `close` again does nothing.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._stopping.set()
+        if self._committer is not None:
+            self._committer.join()
+        self._commit()
+        self._wait_for_compaction()
+        self._log.close()
+
+    def __enter__(self) -> DurableTreapMap[KT, VT]:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,73 @@
+import random
+
+from py_treaps.aggregate_treap_map import AggregateTreapMap
+from py_treaps.monoid import COUNT, MAX, MIN, SUM, Monoid
+from py_treaps.treap_map import TreapMap
+
+
+def expected_aggregate(monoid, node):
+    if node is None:
+        return monoid.identity
+    return monoid.combine(
+        monoid.combine(expected_aggregate(monoid, node.left_child), monoid.lift(node.key, node.value)),
+        expected_aggregate(monoid, node.right_child),
+    )
+
+
+def test_range_aggregates_match_scans() -> None:
+    """Test range_aggregate against brute force after random updates."""
+
+    rng = random.Random(8)
+    for monoid in (SUM, MIN, MAX, COUNT):
+        treap = AggregateTreapMap(monoid)
+        data = {}
+        for _ in range(600):
+            key = rng.randrange(150)
+            if rng.random() < 0.3:
+                treap.remove(key)
+                data.pop(key, None)
+            else:
+                value = rng.randrange(-50, 50)
+                treap.insert(key, value)
+                data[key] = value
+
+        root = treap.get_root_node()
+        assert root.aggregate == expected_aggregate(monoid, root)
+        for _ in range(100):
+            lo, hi = sorted(rng.sample(range(-5, 160), 2))
+            in_range = [(k, v) for k, v in data.items() if lo <= k <= hi]
+            expected = monoid.identity
+            for k, v in sorted(in_range):
+                expected = monoid.combine(expected, monoid.lift(k, v))
+            assert treap.range_aggregate(lo, hi) == expected
+
+
+def test_aggregates_survive_split_join_meld() -> None:
+    """Test that structural operations keep aggregates correct."""
+
+    treap = AggregateTreapMap.from_items(((i, i) for i in range(100)), SUM)
+    assert treap.aggregate() == sum(range(100))
+    left, right = treap.split(30)
+    assert left.aggregate() == sum(range(30))
+    assert right.range_aggregate(40, 50, (False, True)) == sum(range(41, 51))
+    left.join(right)
+    left.meld(AggregateTreapMap.from_items(((i, 1) for i in range(50)), SUM))
+    assert left.aggregate() == 50 + sum(range(50, 100))
+
+    # Plain nodes are copied into aggregate nodes rather than linked in.
+    plain = TreapMap.from_items((i, i) for i in range(100, 110))
+    left.join(plain)
+    assert left.aggregate() == 50 + sum(range(50, 110)) and len(plain) == 0
+    assert left.range_aggregate(105, None) == sum(range(105, 110))
+    assert expected_aggregate(SUM, left.get_root_node()) == left.aggregate()
+
+
+def test_user_defined_monoid() -> None:
+    """Test a non-commutative monoid: concatenation in key order."""
+
+    concat = Monoid("", lambda a, b: a + b)
+    treap = AggregateTreapMap(concat)
+    for ch in "treaps":
+        treap.insert(ch, ch)
+    assert treap.aggregate() == "aeprst"
+    assert treap.range_aggregate("b", "r") == "aeprst"[1:4]
@@ -0,0 +1,99 @@
+import random
+
+from py_treaps.arena_treap_map import ArenaTreapMap
+
+
+def test_arena_insert_lookup_remove() -> None:
+    """Test the arena backend against a dict."""
+
+    rng = random.Random(3)
+    treap = ArenaTreapMap()
+    expected = {}
+    for _ in range(2000):
+        key = rng.randrange(300)
+        if rng.random() < 0.3:
+            assert treap.remove(key) == expected.pop(key, None)
+        else:
+            treap.insert(key, str(key))
+            expected[key] = str(key)
+    assert list(treap) == sorted(expected)
+    for key in range(300):
+        assert treap.lookup(key) == expected.get(key)
+    # Removed handles are recycled rather than growing the columns.
+    assert len(treap.arena.keys) <= 300
+
+
+def test_arena_split_join_share_storage() -> None:
+    """Test that split and join relink handles within one arena."""
+
+    treap = ArenaTreapMap.from_items((i, i * i) for i in range(100))
+    left, right = treap.split(40)
+    assert left.arena is right.arena is treap.arena
+    assert list(left) == list(range(40))
+    assert list(right) == list(range(40, 100))
+
+    left.join(right)
+    assert list(left) == list(range(100))
+    assert all(left.lookup(i) == i * i for i in range(100))
+
+
+def test_arena_reclaims_dropped_halves() -> None:
+    """Test that dropping or clearing a split half frees its handles."""
+
+    treap = ArenaTreapMap.from_items((i, str(i)) for i in range(100))
+    arena = treap.arena
+    left, right = treap.split(30)
+    del right
+    assert len(arena.free) == 70 and arena.values.count(None) == 70
+    for i in range(100, 170):
+        left.insert(i, str(i))
+    assert len(arena.keys) == 100 and not arena.free
+
+    left.clear()
+    assert list(left) == [] and len(arena.free) == 100
+
+
+def test_arena_balance_factor() -> None:
+    """Test balance_factor on empty and populated arena treaps."""
+
+    assert ArenaTreapMap().balance_factor() == 1.0
+    treap = ArenaTreapMap.from_items((i, i) for i in range(1000))
+    assert 1.0 <= treap.balance_factor() < 4.0
+
+
+def test_arena_meld_and_difference() -> None:
+    """Test handle-based meld and difference within and across arenas."""
+
+    rng = random.Random(11)
+    for other_size in (5, 300, 2000):
+        mine = {k: "a" for k in rng.sample(range(3000), 1000)}
+        theirs = {k: "b" for k in rng.sample(range(3000), other_size)}
+
+        treap = ArenaTreapMap.from_items(mine.items())
+        arena = treap.arena
+        other = ArenaTreapMap(arena)
+        other.join(ArenaTreapMap.from_items(theirs.items()))
+        treap.meld(other)
+        merged = {**mine, **theirs}
+        assert list(treap) == sorted(merged)
+        assert all(treap.lookup(k) == v for k, v in merged.items())
+        assert list(other) == []
+        # The handles of shared keys went back to the arena.
+        assert len(arena.keys) - len(arena.free) == len(merged)
+
+        treap = ArenaTreapMap.from_items(mine.items())
+        other = ArenaTreapMap.from_items(theirs.items())
+        treap.difference(other)
+        assert list(treap) == sorted(set(mine) - set(theirs))
+        assert list(other) == [] and len(other.arena.free) == len(theirs)
+        assert len(treap.arena.keys) - len(treap.arena.free) == len(list(treap))
+
+
+def test_arena_join_across_arenas_drains_other() -> None:
+    """Test that joining another arena's map copies it and empties it."""
+
+    treap = ArenaTreapMap.from_items((i, i) for i in range(50))
+    other = ArenaTreapMap.from_items((i, -i) for i in range(50, 80))
+    treap.join(other)
+    assert list(treap) == list(range(80)) and treap.lookup(60) == -60
+    assert list(other) == [] and len(other.arena.free) == 30
@@ -0,0 +1,55 @@
+import threading
+
+from py_treaps.concurrent_treap_map import ConcurrentTreapMap
+
+
+def test_readers_see_complete_versions() -> None:
+    """Test that readers racing writers only see whole updates."""
+
+    treap = ConcurrentTreapMap.from_items((i, 0) for i in range(200))
+    stop = threading.Event()
+    errors = []
+
+    def writer(offset):
+        for round_ in range(1, 30):
+            # Each round bumps every key at once through one update.
+            def bump(version):
+                for key in range(offset, 200, 2):
+                    version = version.insert(key, round_)
+                return version
+
+            treap.update(bump)
+
+    def reader():
+        while not stop.is_set():
+            snapshot = treap.snapshot()
+            evens = {snapshot.lookup(k) for k in range(0, 200, 2)}
+            if len(evens) != 1 or len(snapshot) != 200:
+                errors.append(evens)
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(2)]
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    stop.set()
+    for t in readers:
+        t.join()
+
+    assert not errors
+    assert all(treap.lookup(k) == 29 for k in range(200))
+
+
+def test_basic_operations() -> None:
+    """Test the TreapMap-style operations of the wrapper."""
+
+    treap = ConcurrentTreapMap()
+    for i in range(50):
+        treap.insert(i, str(i))
+    assert treap.remove(10) == "10" and 10 not in treap
+    left, right = treap.split(25)
+    assert len(treap) == 0
+    assert list(left) == [i for i in range(25) if i != 10]
+    left.join(right)
+    assert len(left) == 49 and len(right) == 0
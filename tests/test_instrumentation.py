@@ -0,0 +1,147 @@
+import math
+import random
+
+import pytest
+
+from py_treaps.aggregate_treap_map import AggregateTreapMap
+from py_treaps.instrumentation import InstrumentedTreapMap, TreapStats, instrument, uninstrument
+from py_treaps.monoid import SUM
+from py_treaps.priority import HashPriority
+from py_treaps.treap_map import TreapMap
+
+
+def test_counters() -> None:
+    """Test comparison, rotation, path and node counts."""
+
+    treap = InstrumentedTreapMap(HashPriority())
+    for k in range(100):
+        treap.insert(k, k)
+    stats = treap.stats
+    assert stats.nodes_created == 100
+    assert stats.left_rotations + stats.right_rotations > 0
+    assert sum(stats.path_lengths.values()) == 100
+
+    stats.reset()
+    assert treap.lookup(42) == 42
+    assert treap.lookup(1000) is None
+    # One comparison or two per visited node.
+    (length_a, length_b) = sorted(stats.path_lengths.elements())
+    assert length_a + length_b <= stats.comparisons <= 2 * (length_a + length_b)
+
+    assert treap.remove(42) == 42 and treap.remove(42) is None
+    assert stats.nodes_freed == 1
+
+    other = TreapMap.from_items((k, -k) for k in range(90, 110))
+    treap.meld(other)
+    assert stats.nodes_freed == 1 + 10
+    treap.difference(TreapMap.from_items((k, 0) for k in range(50)))
+    assert stats.nodes_freed == 11 + 49 + 50
+    assert len(treap) == 60
+
+    left, right = treap.split(70)
+    assert left.stats is stats and right.stats is stats
+    for op in ("lookup", "remove", "meld", "difference", "split"):
+        assert stats.latencies[op].count >= 1
+    data = stats.as_dict()
+    assert data["nodes_freed"] == 110 and data["latencies"]["lookup"]["count"] == 2
+
+
+def test_instrument_existing_treap() -> None:
+    """Test switching instrumentation on and off for any TreapMap class."""
+
+    treap = AggregateTreapMap.from_items(((k, k) for k in range(10)), SUM)
+    shared = TreapStats()
+    assert instrument(treap, shared) is treap
+    treap.insert(10, 10)
+    assert treap.aggregate() == 55
+    assert isinstance(treap, AggregateTreapMap)
+    assert shared.nodes_created == 1 and shared.latencies["insert"].count == 1
+
+    assert uninstrument(treap) is shared
+    assert type(treap) is AggregateTreapMap
+    treap.insert(11, 11)
+    assert shared.nodes_created == 1
+    with pytest.raises(ValueError):
+        uninstrument(treap)
+
+
+class CountingKey:
+    """A key that counts the comparisons made between two such keys."""
+
+    comparisons = 0
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+
+    def __repr__(self) -> str:
+        return f"CountingKey({self.k})"
+
+    def __hash__(self) -> int:
+        return hash(self.k)
+
+    def _compare(self, other, op):
+        if not isinstance(other, CountingKey):
+            return NotImplemented
+        CountingKey.comparisons += 1
+        return op(self.k, other.k)
+
+    def __lt__(self, other):
+        return self._compare(other, lambda a, b: a < b)
+
+    def __gt__(self, other):
+        return self._compare(other, lambda a, b: a > b)
+
+    def __le__(self, other):
+        return self._compare(other, lambda a, b: a <= b)
+
+    def __ge__(self, other):
+        return self._compare(other, lambda a, b: a >= b)
+
+    def __eq__(self, other):
+        return self._compare(other, lambda a, b: a == b)
+
+
+def test_comparison_counts_are_exact() -> None:
+    """Test counted comparisons against the comparisons keys actually made."""
+
+    treap = InstrumentedTreapMap(HashPriority())
+    rng = random.Random(19)
+    hint = None
+    for k in range(0, 400, 4):
+        treap.append(CountingKey(k), k)
+    for _ in range(500):
+        key = CountingKey(rng.randrange(500))
+        before, counted = CountingKey.comparisons, treap.stats.comparisons
+        op = rng.randrange(4)
+        if op == 0:
+            hint = treap.insert(key, 0)
+        elif op == 1:
+            hint = treap.insert(key, 0, hint=hint)
+        elif op == 2:
+            treap.lookup(key)
+        else:
+            treap.remove(key)
+        assert treap.stats.comparisons - counted == CountingKey.comparisons - before
+    before, counted = CountingKey.comparisons, treap.stats.comparisons
+    treap.append(CountingKey(1000), 0)
+    assert treap.stats.comparisons - counted == CountingKey.comparisons - before
+
+
+def test_difference_cost_is_bounded_by_the_smaller_side() -> None:
+    """Test O(m log(n/m + 1)) comparisons for difference with either side small."""
+
+    rng = random.Random(7)
+    large = [(k, k) for k in range(0, 100000, 2)]
+    for m in (10, 1000):
+        small = sorted((k, k) for k in rng.sample(range(100000), m))
+        bound = 4 * m * math.log2(len(large) / m + 1)
+
+        a = InstrumentedTreapMap.from_sorted(small, HashPriority())
+        a.difference(TreapMap.from_sorted(large, HashPriority()))
+        assert list(a) == [k for k, _ in small if k % 2]
+        assert a.stats.comparisons < bound
+
+        a = InstrumentedTreapMap.from_sorted(large, HashPriority())
+        a.difference(TreapMap.from_sorted(small, HashPriority()))
+        assert len(a) == len(large) - sum(k % 2 == 0 for k, _ in small)
+        assert a.stats.comparisons < bound
@@ -0,0 +1,107 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from operator import attrgetter
+
+from py_treaps.keyed_treap_map import KeyedTreapMap
+from py_treaps.treap_map import TreapMap
+from tests.test_treaps import check_treap_invariants
+
+
+@dataclass(frozen=True)
+class Version:
+    major: int
+    minor: int
+    label: str = ""
+
+    def __lt__(self, other: "Version") -> bool:
+        raise AssertionError("keys must only be compared through their sort keys")
+
+
+def sort_key(version: Version) -> tuple:
+    return (version.major, version.minor)
+
+
+def test_keyed_operations_match_dict() -> None:
+    """Test a keyed treap under random updates against a dict of sort keys."""
+
+    rng = random.Random(22)
+    t = KeyedTreapMap(sort_key)
+    expected = {}
+    for step in range(2000):
+        v = Version(rng.randrange(20), rng.randrange(20), str(step))
+        if rng.random() < 0.7:
+            t.insert(v, step)
+            expected[sort_key(v)] = (v, step)
+        else:
+            found = expected.pop(sort_key(v), None)
+            assert t.remove(v) == (found[1] if found else None)
+    assert check_treap_invariants(t.get_root_node()) == len(t) == len(expected)
+
+    entries = [expected[k] for k in sorted(expected)]
+    assert list(t.items()) == entries
+    assert list(t) == [v for v, _ in entries]
+    assert list(reversed(t)) == [v for v, _ in reversed(entries)]
+    for k, (v, value) in expected.items():
+        assert t.lookup(Version(*k)) == value
+        assert t.locate(Version(*k)).item_key is v
+    assert t.select(0) == entries[0][0] and t.median() == entries[(len(entries) - 1) // 2][0]
+
+    probe = Version(10, 5)
+    below = [v for v, _ in entries if sort_key(v) <= (10, 5)]
+    above = [v for v, _ in entries if sort_key(v) > (10, 5)]
+    assert t.floor(probe) == below[-1] and t.successor(probe) == above[0]
+    assert t.rank(probe) == len([v for v in below if sort_key(v) < (10, 5)])
+    assert list(t.irange(Version(3, 0), Version(4, 19))) == [
+        v for v, _ in entries if (3, 0) <= sort_key(v) <= (4, 19)
+    ]
+    assert t.lookup_many([Version(*k) for k in expected]) == [
+        value for _, value in expected.values()
+    ]
+    assert t.peek_min() == entries[0] and t.pop_max() == entries[-1]
+
+    async def collect():
+        return [item async for item in t.aitems(chunk_size=5, budget=None)]
+
+    assert asyncio.run(collect()) == entries[:-1]
+
+
+def test_keyed_replace_and_bulk() -> None:
+    """Test that an equal sort key replaces the key, and the bulk paths."""
+
+    t = KeyedTreapMap.from_items([("b", 1), ("A", 2), ("a", 3), ("C", 4)], str.lower)
+    assert list(t.items()) == [("a", 3), ("b", 1), ("C", 4)]
+    t.insert("B", 5)
+    assert t.lookup("b") == 5 and list(t) == ["a", "B", "C"]
+
+    t.insert_many(["d", "E"], [6, 7])
+    assert t.remove_many(["A", "c", "z"]) == 2
+    assert list(t.items()) == [("B", 5), ("d", 6), ("E", 7)]
+
+    left, right = t.split("D")
+    assert isinstance(left, KeyedTreapMap) and list(left) == ["B"]
+    left.join(right)
+    left.meld(TreapMap.from_items([("e", 8), ("f", 9)]))
+    # Either "e" or "E" may be kept; the value follows `resolve`.
+    assert [(k.lower(), v) for k, v in left.items()] == [("b", 5), ("d", 6), ("e", 8), ("f", 9)]
+
+    # Plain nodes have no stored key, so joining a TreapMap copies them.
+    plain = TreapMap.from_items([("G", 10), ("h", 11)])
+    left.join(plain)
+    assert len(plain) == 0 and list(left)[-2:] == ["G", "h"]
+    assert left.lookup("g") == 10 and left.select(5) == "h"
+    assert check_treap_invariants(left.get_root_node()) == len(left)
+
+    by_length = KeyedTreapMap.from_sorted([("x", 1), ("yy", 2)], len)
+    assert by_length.lookup("zz") == 2 and by_length.ceiling("abc") is None
+
+
+def test_keyed_search_skips_key_comparisons() -> None:
+    """Test that key objects never compare once their sort keys are cached."""
+
+    t = KeyedTreapMap(attrgetter("major", "minor"))
+    for i in range(500):
+        t.insert(Version(i % 37, i), i)
+    assert t.lookup(Version(3, 40)) == 40
+    assert t.remove(Version(3, 40)) == 40 and t.lookup(Version(3, 40)) is None
+    assert check_treap_invariants(t.get_root_node()) == 499
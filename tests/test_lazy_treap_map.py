@@ -0,0 +1,91 @@
+import asyncio
+import random
+
+import pytest
+
+from py_treaps.lazy_treap_map import LazyTreapMap
+from py_treaps.monoid import ADD_TO_MIN_MAX, ADD_TO_SUM, AFFINE_TO_MIN_MAX, AFFINE_TO_SUM, MIN, SUM
+
+
+def in_range(k, lo, hi):
+    return (lo is None or lo <= k) and (hi is None or k <= hi)
+
+
+def test_range_updates_match_brute_force() -> None:
+    """Test lazy add/affine updates interleaved with every operation."""
+
+    rng = random.Random(9)
+    for monoid, action, make_tag, apply in (
+        (SUM, ADD_TO_SUM, lambda: rng.randrange(-5, 6), lambda t, v: v + t),
+        (MIN, ADD_TO_MIN_MAX, lambda: rng.randrange(-5, 6), lambda t, v: v + t),
+        (SUM, AFFINE_TO_SUM, lambda: (rng.randrange(3), rng.randrange(-3, 4)), lambda t, v: t[0] * v + t[1]),
+    ):
+        treap = LazyTreapMap(monoid, action)
+        data = {}
+        for step in range(700):
+            op = rng.randrange(6)
+            key = rng.randrange(120)
+            if op == 0:
+                treap.insert(key, step)
+                data[key] = step
+            elif op == 1:
+                assert treap.remove(key) == data.pop(key, None)
+            elif op == 2:
+                lo, hi = sorted(rng.sample(range(120), 2))
+                if rng.random() < 0.2:
+                    lo = None
+                tag = make_tag()
+                treap.range_update(lo, hi, tag)
+                for k in data:
+                    if in_range(k, lo, hi):
+                        data[k] = apply(tag, data[k])
+            elif op == 3:
+                assert treap.lookup(key) == data.get(key)
+                batch = [rng.randrange(120) for _ in range(8)]
+                assert treap.lookup_many(batch, -1) == [data.get(k, -1) for k in batch]
+            elif op == 4:
+                left, right = treap.split(key)
+                left.join(right)
+                treap = left
+            else:
+                lo, hi = sorted(rng.sample(range(120), 2))
+                inclusive = (rng.random() < 0.5, rng.random() < 0.5)
+                expected = monoid.identity
+                for k in sorted(data):
+                    if (lo < k or inclusive[0] and k == lo) and (k < hi or inclusive[1] and k == hi):
+                        expected = monoid.combine(expected, data[k])
+                assert treap.range_aggregate(lo, hi, inclusive) == expected
+        assert list(treap.items()) == sorted(data.items())
+        assert treap.aggregate() == (
+            sum(data.values()) if monoid is SUM else min(data.values(), default=MIN.identity)
+        )
+
+
+def test_range_update_bounds_and_scans() -> None:
+    """Test exclusive bounds and range scans over pending updates."""
+
+    treap = LazyTreapMap.from_items(((i, 0) for i in range(20)), SUM, ADD_TO_SUM)
+    treap.range_update(5, 10, 1, inclusive=(False, False))
+    treap.range_update(None, None, 100)
+    assert [v - 100 for v in treap.values()] == [1 if 5 < i < 10 else 0 for i in range(20)]
+    assert list(treap.irange(6, 8)) == [6, 7, 8]
+    assert treap.lookup_many([4, 6]) == [100, 101]
+    fresh = LazyTreapMap.from_items(((i, 0) for i in range(50)), SUM, ADD_TO_SUM)
+    fresh.range_update(10, 40, 5)
+    assert [fresh.locate(i).value for i in range(50)] == [5 if 10 <= i <= 40 else 0 for i in range(50)]
+    assert fresh.locate(60) is None
+    treap.range_update(3, 15, 10)
+    assert list(treap.irange(4, 12, (False, False), reverse=True)) == list(range(11, 4, -1))
+
+    async def scan():
+        return [item async for item in treap.aitems(chunk_size=3)]
+
+    # The chunked scan seeks past each chunk and reads values as it goes.
+    expected = [(i, 100 + (1 if 5 < i < 10 else 0) + (10 if 3 <= i <= 15 else 0)) for i in range(20)]
+    assert asyncio.run(scan()) == expected
+
+    with pytest.raises(ValueError):
+        minimum = LazyTreapMap.from_items(((i, i) for i in range(5)), MIN, AFFINE_TO_MIN_MAX)
+        minimum.range_update(1, 3, (-1, 0))
+    assert list(minimum.values()) == [0, 1, 2, 3, 4]
+    assert minimum.aggregate() == 0
@@ -0,0 +1,131 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from py_treaps.aggregate_treap_map import AggregateTreapMap
+from py_treaps.keyed_treap_map import KeyedTreapMap
+from py_treaps.lazy_treap_map import LazyTreapMap
+from py_treaps.monoid import ADD_TO_SUM, SUM
+from py_treaps.parallel import parallel_from_items, parallel_map_values, parallel_meld
+from py_treaps.priority import HashPriority
+from py_treaps.treap_map import TreapMap
+from tests.test_treaps import check_treap_invariants
+
+
+def add(key, self_value, other_value):
+    return self_value + other_value
+
+
+def double(value):
+    return 2 * value
+
+
+def fail_on_999(value):
+    if value == 999:
+        raise ValueError(value)
+    return value
+
+
+def fail_on_key_999(key, self_value, other_value):
+    if key == 999:
+        raise ValueError(key)
+    return other_value
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        yield executor
+
+
+def test_parallel_from_items(pool) -> None:
+    """Test that a sharded build matches the serial one, last value winning."""
+
+    rng = random.Random(15)
+    items = [(rng.randrange(5000), i) for i in range(4000)]
+    treap = parallel_from_items(items, workers=3, priorities=HashPriority(), executor=pool)
+    expected = TreapMap.from_items(items)
+    assert list(treap.items()) == list(expected.items())
+    assert check_treap_invariants(treap.get_root_node()) == len(treap)
+
+    assert len(parallel_from_items([], workers=3, executor=pool)) == 0
+
+
+def test_parallel_meld(pool) -> None:
+    """Test a sharded meld against the serial one."""
+
+    rng = random.Random(16)
+    a_keys = rng.sample(range(10000), 3000)
+    b_keys = rng.sample(range(10000), 2000)
+
+    treap = TreapMap.from_items((k, 1) for k in a_keys)
+    other = TreapMap.from_items((k, 10) for k in b_keys)
+    expected = TreapMap.from_items((k, 1) for k in a_keys)
+    expected.meld(TreapMap.from_items((k, 10) for k in b_keys), add)
+    parallel_meld(treap, other, add, workers=3, executor=pool)
+    assert list(treap.items()) == list(expected.items())
+    assert len(other) == 0
+    assert check_treap_invariants(treap.get_root_node()) == len(treap)
+
+
+def test_parallel_map_values(pool) -> None:
+    """Test that a sharded value transform keeps the treap's shape."""
+
+    treap = TreapMap.from_items((i, i) for i in range(2000))
+    shape = _preorder(treap)
+    parallel_map_values(treap, double, workers=3, executor=pool)
+    assert list(treap.items()) == [(i, 2 * i) for i in range(2000)]
+    assert _preorder(treap) == shape
+
+
+def test_failure_restores_inputs(pool) -> None:
+    """Test that unpicklable callbacks and worker errors leave the inputs intact."""
+
+    treap = TreapMap.from_items((i, i) for i in range(2000))
+    other = TreapMap.from_items((i, -i) for i in range(0, 4000, 3))
+    before, other_before = list(treap.items()), list(other.items())
+    for fn in (lambda value: value, fail_on_999):
+        with pytest.raises(Exception):
+            parallel_map_values(treap, fn, workers=3, executor=pool)
+        assert list(treap.items()) == before
+    for resolve in (lambda key, a, b: b, fail_on_key_999):
+        with pytest.raises(Exception):
+            parallel_meld(treap, other, resolve, workers=3, executor=pool)
+        assert list(treap.items()) == before and list(other.items()) == other_before
+    assert check_treap_invariants(treap.get_root_node()) == len(treap)
+    assert check_treap_invariants(other.get_root_node()) == len(other)
+
+
+def test_subclasses_keep_their_nodes(pool) -> None:
+    """Test that augmented subclasses come back with their own node data."""
+
+    treap = AggregateTreapMap.from_items(((i, -i) for i in range(1000)), SUM)
+    parallel_map_values(treap, abs, workers=3, executor=pool)
+    assert treap.range_aggregate(100, 199) == sum(range(100, 200))
+    other = AggregateTreapMap.from_items(((i, 1) for i in range(0, 2000, 2)), SUM)
+    parallel_meld(treap, other, add, workers=3, executor=pool)
+    assert treap.aggregate() == sum(range(1000)) + 1000
+    assert treap.range_aggregate(1000, None) == 500
+
+    lazy = LazyTreapMap.from_items(((i, i) for i in range(500)), SUM, ADD_TO_SUM)
+    lazy.range_update(0, 99, 1000)
+    parallel_map_values(lazy, double, workers=3, executor=pool)
+    assert lazy.range_aggregate(0, 9) == 2 * sum(range(1000, 1010))
+    lazy.range_update(None, None, 1)
+    assert lazy.lookup(200) == 401
+
+    keyed = KeyedTreapMap.from_items([("a", 1)], str.lower)
+    with pytest.raises(TypeError):
+        parallel_map_values(keyed, double, workers=3, executor=pool)
+    assert list(keyed.items()) == [("a", 1)]
+
+
+def _preorder(treap):
+    out = []
+    stack = [treap.get_root_node()] if treap.get_root_node() is not None else []
+    while stack:
+        node = stack.pop()
+        out.append((node.key, node.priority))
+        stack.extend(c for c in (node.right_child, node.left_child) if c is not None)
+    return out
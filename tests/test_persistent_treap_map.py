@@ -0,0 +1,76 @@
+import random
+
+from py_treaps.persistent_treap_map import PersistentTreapMap
+
+
+def check_persistent_invariants(node, lo=None, hi=None) -> int:
+    if node is None:
+        return 0
+    for child in (node.left_child, node.right_child):
+        if child is not None:
+            assert child.priority <= node.priority
+    if lo is not None:
+        assert lo < node.key
+    if hi is not None:
+        assert node.key < hi
+    size = (
+        1
+        + check_persistent_invariants(node.left_child, lo, node.key)
+        + check_persistent_invariants(node.right_child, node.key, hi)
+    )
+    assert node.size == size
+    return size
+
+
+def test_versions_are_independent() -> None:
+    """Test that updates leave earlier versions untouched."""
+
+    rng = random.Random(2)
+    versions = [PersistentTreapMap()]
+    states = [{}]
+    for _ in range(400):
+        key = rng.randrange(100)
+        current, state = versions[-1], dict(states[-1])
+        if rng.random() < 0.3:
+            current = current.remove(key)
+            state.pop(key, None)
+        else:
+            current = current.insert(key, rng.random())
+            state[key] = current.lookup(key)
+        versions.append(current)
+        states.append(state)
+
+    for version, state in zip(versions, states):
+        assert dict(version.items()) == state
+        assert len(version) == len(state)
+        check_persistent_invariants(version.get_root_node())
+
+
+def test_split_join_and_snapshot() -> None:
+    """Test that split/join return new versions sharing structure."""
+
+    base = PersistentTreapMap.from_items((i, str(i)) for i in range(100))
+    snap = base.snapshot()
+    left, right = base.split(40)
+    assert list(left) == list(range(40))
+    assert list(right) == list(range(40, 100))
+    check_persistent_invariants(right.get_root_node())
+
+    joined = left.join(right.insert(150, "x"))
+    assert list(joined) == list(range(100)) + [150]
+    assert list(snap) == list(base) == list(range(100))
+
+    # An update copies a path; the rest of the tree is shared.
+    updated = base.insert(1000, "y")
+    shared = {id(n) for n in _nodes(base.get_root_node())}
+    copied = [n for n in _nodes(updated.get_root_node()) if id(n) not in shared]
+    assert len(copied) < 30
+
+
+def _nodes(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is not None:
+            yield node
+            stack.extend((node.left_child, node.right_child))
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from py_treaps.serialization import MappedTreap, dump, dump_entries, load
+from py_treaps.treap_map import TreapMap
+
+
+def test_dump_load_preserves_shape(tmp_path) -> None:
+    """Test that a checkpoint reloads into the identical treap."""
+
+    treap = TreapMap.from_items((i, {"v": i}) for i in range(0, 3000, 3))
+    buf = io.BytesIO()
+    size = dump(treap, buf)
+    assert size == len(buf.getvalue())
+
+    buf.seek(0)
+    loaded = load(buf)
+    assert str(loaded) == str(treap)
+    assert len(loaded) == len(treap)
+    assert loaded.lookup(2997) == {"v": 2997}
+
+    empty = io.BytesIO()
+    dump(TreapMap(), empty)
+    empty.seek(0)
+    assert load(empty).get_root_node() is None
+
+    with pytest.raises(ValueError):
+        load(io.BytesIO(b"garbage" * 10))
+
+
+def test_dump_rejects_out_of_range_priorities() -> None:
+    """Test that priorities outside u64 fail with ValueError before writing."""
+
+    treap = TreapMap.from_items((i, i) for i in range(100))
+    for bad in (-1, 1 << 64):
+        treap.insert(50, 0)
+        treap.locate(50).priority = bad
+        buf = io.BytesIO()
+        with pytest.raises(ValueError, match="priority"):
+            dump(treap, buf)
+        assert buf.getvalue() == b""
+
+    with pytest.raises(ValueError, match="key 'b'"):
+        dump_entries([("a", 1, 5), ("b", 2, 2.5)], io.BytesIO())
+
+
+def test_mapped_lookup(tmp_path) -> None:
+    """Test answering lookups from a memory-mapped checkpoint."""
+
+    treap = TreapMap.from_items((f"k{i:05}", i) for i in range(500))
+    treap.insert("k00007", None)
+    path = tmp_path / "treap.bin"
+    with open(path, "wb") as f:
+        dump(treap, f)
+
+    with MappedTreap(str(path)) as mapped:
+        assert len(mapped) == 500
+        assert mapped.lookup("k00123") == 123
+        assert mapped.lookup("missing") is None
+        assert "k00007" in mapped and "missing" not in mapped
+        assert list(mapped.items()) == list(treap.items())
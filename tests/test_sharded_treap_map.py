@@ -0,0 +1,124 @@
+import random
+import threading
+
+import pytest
+
+from py_treaps import sharded_treap_map
+from py_treaps.sharded_treap_map import ShardedTreapMap
+
+
+def test_routing_and_ordered_iteration() -> None:
+    """Test that keys land in their range's shard and iterate in order."""
+
+    treap = ShardedTreapMap([100, 200, 300])
+    keys = random.Random(16).sample(range(400), 250)
+    for k in keys:
+        treap.insert(k, -k)
+    ranges = ((0, 100), (100, 200), (200, 300), (300, 400))
+    assert treap.shard_sizes() == [sum(lo <= k < hi for k in keys) for lo, hi in ranges]
+    assert list(treap) == sorted(keys)
+    assert list(treap.items()) == [(k, -k) for k in sorted(keys)]
+    assert list(treap.irange(150, 320)) == sorted(k for k in keys if 150 <= k <= 320)
+    assert treap.remove(keys[0]) == -keys[0] and keys[0] not in treap
+    assert treap.lookup(keys[1]) == -keys[1]
+    assert len(treap) == 249
+    assert all(k in treap for k in keys[1:]) and 400 not in treap
+
+    with pytest.raises(ValueError):
+        ShardedTreapMap([3, 3])
+
+
+def test_iteration_copies_bounded_chunks(monkeypatch) -> None:
+    """Test that a walk resumes after each chunk and sees writes between them."""
+
+    monkeypatch.setattr(sharded_treap_map, "_CHUNK_SIZE", 4)
+    treap = ShardedTreapMap.from_items(((i, i) for i in range(0, 40, 2)), shards=2)
+    walk = treap.irange(3, 33)
+    seen = [next(walk) for _ in range(4)]
+    assert seen == [4, 6, 8, 10]
+    treap.insert(5, 5)
+    treap.insert(11, 11)
+    treap.remove(12)
+    assert seen + list(walk) == [4, 6, 8, 10, 11] + list(range(14, 34, 2))
+    assert list(treap.items())[:6] == [(0, 0), (2, 2), (4, 4), (5, 5), (6, 6), (8, 8)]
+
+
+def test_from_items_and_size_rebalancing() -> None:
+    """Test that large shards split at their median and small ones join."""
+
+    treap = ShardedTreapMap.from_items(((i, i) for i in range(1000)), shards=4)
+    assert treap.shard_sizes() == [250, 250, 250, 250]
+
+    treap.max_shard_size = 100
+    for i in range(1000, 1200):
+        treap.insert(i, i)
+    treap.rebalance()
+    sizes = treap.shard_sizes()
+    assert max(sizes) <= 100 and sum(sizes) == 1200
+    assert list(treap) == list(range(1200))
+
+    for i in range(1200):
+        if i % 50:
+            treap.remove(i)
+    treap.rebalance()
+    assert len(treap.shard_sizes()) < len(sizes)
+    assert list(treap) == list(range(0, 1200, 50))
+
+
+def test_hot_shard_splits() -> None:
+    """Test that a shard taking most writes is split."""
+
+    treap = ShardedTreapMap.from_items(
+        ((i, 0) for i in range(400)), shards=2, hot_fraction=0.6, window=100
+    )
+    bounds = treap.shard_bounds()
+    for round_ in range(3):
+        for i in range(100):
+            treap.insert(i, round_)
+    assert len(treap.shard_bounds()) > len(bounds)
+    assert all(b < 200 for b in treap.shard_bounds() if b not in bounds)
+
+
+def test_moving_hot_spot_keeps_shard_count_bounded() -> None:
+    """Test that shards split for an old hot spot are joined once it cools."""
+
+    treap = ShardedTreapMap.from_items(
+        ((i, 0) for i in range(4000)), shards=2, hot_fraction=0.6, window=100
+    )
+    counts = []
+    for spot in range(0, 4000, 100):
+        for i in range(300):
+            treap.insert(spot + i % 100, i)
+        counts.append(len(treap.shard_sizes()))
+    assert max(counts) <= 12
+    assert list(treap) == list(range(4000))
+
+
+def test_concurrent_writers_and_rebalancing() -> None:
+    """Test threads writing and iterating while shards split and join."""
+
+    treap = ShardedTreapMap(max_shard_size=64, window=50)
+    errors = []
+
+    def writer(offset):
+        for k in range(offset, 2000, 4):
+            treap.insert(k, k)
+        for k in range(offset, 2000, 8):
+            treap.remove(k)
+
+    def reader():
+        for _ in range(20):
+            keys = list(treap)
+            if keys != sorted(keys) or len(set(keys)) != len(keys):
+                errors.append(keys)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(4)]
+    threads.append(threading.Thread(target=reader))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert list(treap) == [k for k in range(2000) if k % 8 >= 4]
+    assert max(treap.shard_sizes()) <= 64
@@ -0,0 +1,87 @@
+import math
+import random
+
+import pytest
+
+from py_treaps.treap_cache import TreapCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_expiry() -> None:
+    """Test per-entry and default TTLs, lazy expiry in get and expire()."""
+
+    clock = FakeClock()
+    cache = TreapCache(ttl=10.0, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=5.0)
+    cache.put("c", 3, ttl=math.inf)
+    clock.now = 4.0
+    assert cache.get("b") == 2 and "b" in cache
+    clock.now = 5.0
+    assert "b" not in cache and cache.get("b") is None
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 1, "evictions": 0, "expirations": 1}
+
+    cache.put("a", 10, ttl=20.0)
+    clock.now = 15.0
+    assert cache.expire() == 0
+    clock.now = 30.0
+    assert cache.expire() == 1
+    assert list(cache) == ["c"] and cache.get("c") == 3
+    assert len(cache.deadlines) == 0
+
+
+def test_capacity_evicts_least_recently_used() -> None:
+    """Test that puts beyond capacity drop the least recently used entry."""
+
+    cache = TreapCache(capacity=3)
+    for k in "abc":
+        cache.put(k, k.upper())
+    assert cache.get("a") == "A"
+    cache.put("d", "D")
+    assert list(cache) == ["a", "c", "d"] and cache.evictions == 1
+    cache.put("c", "C2")
+    cache.put("e", "E")
+    assert list(cache) == ["c", "d", "e"]
+    assert cache.pop("d") == "D" and cache.pop("d", 0) == 0
+    with pytest.raises(ValueError):
+        TreapCache(capacity=0)
+
+
+def test_cache_matches_model() -> None:
+    """Test random operations against a brute-force model of the cache."""
+
+    rng = random.Random(23)
+    clock = FakeClock()
+    cache = TreapCache(capacity=40, ttl=25.0, clock=clock)
+    model = {}  # key -> [value, deadline, last use]
+    use = 0
+    for step in range(5000):
+        clock.now += rng.random()
+        key = rng.randrange(100)
+        use += 1
+        if rng.random() < 0.5:
+            ttl = rng.choice([None, 5.0, 50.0, math.inf])
+            cache.put(key, step, ttl=ttl)
+            model = {k: e for k, e in model.items() if e[1] > clock.now}
+            model.pop(key, None)
+            model[key] = [step, clock.now + (25.0 if ttl is None else ttl), use]
+            while len(model) > 40:
+                del model[min(model, key=lambda k: model[k][2])]
+        else:
+            entry = model.get(key)
+            if entry is not None and entry[1] <= clock.now:
+                del model[key]
+                entry = None
+            if entry is not None:
+                entry[2] = use
+            assert cache.get(key) == (entry[0] if entry else None)
+        assert len(cache.entries) == len(cache.recency)
+    cache.expire()
+    assert sorted(cache) == sorted(k for k, e in model.items() if e[1] > clock.now)
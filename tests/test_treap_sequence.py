@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from py_treaps.priority import HashPriority
+from py_treaps.treap_sequence import TreapSequence
+
+
+def test_sequence_matches_list() -> None:
+    """Test positional edits and lazy reversal against a Python list."""
+
+    rng = random.Random(4)
+    seq = TreapSequence(range(50))
+    expected = list(range(50))
+    for step in range(800):
+        op = rng.randrange(5)
+        if op == 0:
+            i = rng.randrange(len(expected) + 1)
+            seq.insert_at(i, step)
+            expected.insert(i, step)
+        elif op == 1 and expected:
+            i = rng.randrange(len(expected))
+            assert seq.delete_at(i) == expected.pop(i)
+        elif op == 2:
+            i, j = sorted(rng.randrange(len(expected) + 1) for _ in range(2))
+            seq.reverse_range(i, j)
+            expected[i:j] = expected[i:j][::-1]
+        elif op == 3 and expected:
+            i = rng.randrange(len(expected))
+            assert seq[i] == expected[i]
+            seq[i] = -step
+            expected[i] = -step
+        else:
+            i, j = sorted(rng.randrange(len(expected) + 1) for _ in range(2))
+            assert seq[i:j] == expected[i:j]
+    assert list(seq) == expected
+    assert len(seq) == len(expected)
+
+
+def test_cut_and_concat() -> None:
+    """Test extracting a range and splicing sequences together."""
+
+    seq = TreapSequence("abcdefgh")
+    middle = seq.cut(2, 5)
+    assert "".join(middle) == "cde"
+    assert "".join(seq) == "abfgh"
+    middle.reverse_range()
+    seq.concat(middle)
+    assert "".join(seq) == "abfghedc"
+    assert len(middle) == 0
+    seq.append("z")
+    assert seq[-1] == "z" and seq[-2] == "c"
+    with pytest.raises(IndexError):
+        seq.delete_at(100)
+
+
+def test_concat_with_hash_priorities_stays_balanced() -> None:
+    """Test that sequences sharing a HashPriority don't repeat priorities."""
+
+    def height(node):
+        return 0 if node is None else 1 + max(height(node.left_child), height(node.right_child))
+
+    priorities = HashPriority(3)
+    seq = TreapSequence(range(200), priorities)
+    for i in range(1, 100):
+        seq.concat(TreapSequence(range(200 * i, 200 * (i + 1)), priorities))
+    assert list(seq) == list(range(20000))
+    # A fresh treap of 20000 nodes is about 35 high; repeated priorities
+    # stack each concatenated sequence on the last, some 100+ high.
+    assert height(seq.root) < 70
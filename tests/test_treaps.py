@@ -1,4 +1,9 @@
-from py_treaps.treap_map import TreapMap
+import asyncio
+import math
+import random
+
+from py_treaps.priority import HashPriority, PrioritySource, RandomPriority
+from py_treaps.treap_map import TreapMap, prefer_other, prefer_self
 
 import pytest
 from typing import Any
@@ -138,4 +143,503 @@ def test_bst_property_simple_starter() -> None:
         if root_node.key != "0":
             assert root_node.key >= root_node.left_child.key
         if root_node.key != "9":
-            assert root_node.key <= root_node.right_child.key
\ No newline at end of file
+            assert root_node.key <= root_node.right_child.key
+
+def check_treap_invariants(node, parent=None, lo=None, hi=None) -> int:
+    """Check BST, heap and parent-pointer invariants below `node`.
+
+    Returns the number of nodes in the subtree.
+    """
+    if node is None:
+        return 0
+    assert node.parent is parent
+    if parent is not None:
+        assert node.priority <= parent.priority
+    if lo is not None:
+        assert lo < node.key
+    if hi is not None:
+        assert node.key < hi
+    return (
+        1
+        + check_treap_invariants(node.left_child, node, lo, node.key)
+        + check_treap_invariants(node.right_child, node, node.key, hi)
+    )
+
+
+def test_split_search_path() -> None:
+    """Test that `split` partitions keys and empties the original."""
+
+    for threshold in (-1, 0, 17, 49, 50, 100):
+        t = TreapMap()
+        for i in range(50):
+            t.insert(i, str(i))
+        left, right = t.split(threshold)
+
+        assert t.get_root_node() is None
+        assert list(left) == [i for i in range(50) if i < threshold]
+        assert list(right) == [i for i in range(50) if i >= threshold]
+        check_treap_invariants(left.get_root_node())
+        check_treap_invariants(right.get_root_node())
+        for i in range(50):
+            assert (left if i < threshold else right).lookup(i) == str(i)
+
+
+def test_from_sorted_and_from_items() -> None:
+    """Test bulk construction, including duplicate keys."""
+
+    t = TreapMap.from_sorted((i, str(i)) for i in range(200))
+    assert check_treap_invariants(t.get_root_node()) == 200
+    assert list(t) == list(range(200))
+    assert t.lookup(150) == "150"
+
+    t = TreapMap.from_items([(3, "a"), (1, "b"), (3, "c"), (2, "d"), (1, "e")])
+    assert check_treap_invariants(t.get_root_node()) == 3
+    assert [t.lookup(k) for k in (1, 2, 3)] == ["e", "d", "c"]
+
+    assert TreapMap.from_items([]).get_root_node() is None
+    with pytest.raises(ValueError):
+        TreapMap.from_sorted([(2, "a"), (1, "b")])
+
+
+def test_priority_sources() -> None:
+    """Test seeded and key-hashed priority sources."""
+
+    a = TreapMap(RandomPriority(seed=7))
+    b = TreapMap(RandomPriority(seed=7))
+    for i in range(100):
+        a.insert(i, i)
+        b.insert(i, i)
+    assert str(a) == str(b)
+
+    # Key-hashed priorities give the same shape for any insertion order.
+    keys = [str(i) for i in range(200)]
+    forward = TreapMap(HashPriority())
+    backward = TreapMap(HashPriority())
+    for k in keys:
+        forward.insert(k, k)
+    for k in reversed(keys):
+        backward.insert(k, k)
+    assert str(forward) == str(backward)
+    check_treap_invariants(forward.get_root_node())
+
+    # Well past the old 65,535 node pool.
+    big = TreapMap.from_sorted((i, None) for i in range(70000))
+    assert list(big.split(69999)[1]) == [69999]
+
+
+def test_iterators_and_irange() -> None:
+    """Test items/values/reversed and bounded range scans."""
+
+    t = TreapMap()
+    for i in range(0, 40, 2):
+        t.insert(i, str(i))
+    keys = list(range(0, 40, 2))
+
+    assert list(t) == keys
+    assert list(reversed(t)) == keys[::-1]
+    assert list(t.items()) == [(k, str(k)) for k in keys]
+    assert list(t.values()) == [str(k) for k in keys]
+
+    assert list(t.irange(10, 20)) == [10, 12, 14, 16, 18, 20]
+    assert list(t.irange(10, 20, inclusive=(False, False))) == [12, 14, 16, 18]
+    assert list(t.irange(9, 21)) == [10, 12, 14, 16, 18, 20]
+    assert list(t.irange(hi=4)) == [0, 2, 4]
+    assert list(t.irange(lo=34)) == [34, 36, 38]
+    assert list(t.irange(10, 20, reverse=True)) == [20, 18, 16, 14, 12, 10]
+    assert list(t.irange(10, 20, (True, False), reverse=True)) == [18, 16, 14, 12, 10]
+    assert list(t.irange(21, 20)) == []
+
+
+def test_iterate_degenerate_treap() -> None:
+    """Test iterating a treap far taller than the recursion limit."""
+
+    class Ascending(PrioritySource):
+        def __call__(self, key):
+            return key
+
+    t = TreapMap.from_sorted(((i, i) for i in range(5000)), Ascending())
+    assert list(t) == list(range(5000))
+    assert list(t.irange(4990)) == list(range(4990, 5000))
+
+
+def test_subtree_sizes_and_order_statistics() -> None:
+    """Test that sizes survive mutation and back rank/select queries."""
+
+    def check_sizes(node):
+        if node is None:
+            return 0
+        size = 1 + check_sizes(node.left_child) + check_sizes(node.right_child)
+        assert node.size == size
+        return size
+
+    rng = random.Random(11)
+    t = TreapMap()
+    expected = set()
+    for _ in range(1000):
+        k = rng.randrange(200)
+        if rng.random() < 0.4:
+            t.remove(k)
+            expected.discard(k)
+        else:
+            t.insert(k, k)
+            expected.add(k)
+    check_sizes(t.get_root_node())
+    keys = sorted(expected)
+    assert len(t) == len(keys)
+    assert [t.select(i) for i in range(len(keys))] == keys
+    assert t.select(-1) == keys[-1]
+    assert all(t.rank(k) == i for i, k in enumerate(keys))
+    assert t.median() == keys[(len(keys) - 1) // 2]
+    assert t.percentile(100) == keys[-1] and t.percentile(0) == keys[0]
+    assert t.count_range(50, 150) == len([k for k in keys if 50 <= k <= 150])
+    assert t.count_range(50, 150, (False, False)) == len(
+        [k for k in keys if 50 < k < 150]
+    )
+    with pytest.raises(IndexError):
+        t.select(len(keys))
+
+    left, right = t.split(100)
+    check_sizes(left.get_root_node())
+    check_sizes(right.get_root_node())
+    left.join(right)
+    check_sizes(left.get_root_node())
+    assert len(left) == len(keys)
+
+    bulk = TreapMap.from_sorted((i, i) for i in range(300))
+    assert check_sizes(bulk.get_root_node()) == len(bulk) == 300
+    assert len(TreapMap()) == 0
+
+
+def test_set_operations() -> None:
+    """Test union/intersection/difference/symmetric difference."""
+
+    rng = random.Random(5)
+    for _ in range(20):
+        a_items = {rng.randrange(300): ("a", i) for i in range(rng.randrange(150))}
+        b_items = {rng.randrange(300): ("b", i) for i in range(rng.randrange(150))}
+
+        def build():
+            return (
+                TreapMap.from_items(a_items.items()),
+                TreapMap.from_items(b_items.items()),
+            )
+
+        a, b = build()
+        a.meld(b)
+        assert dict(a.items()) == {**a_items, **b_items}
+        assert check_treap_invariants(a.get_root_node()) == len(a)
+        assert b.get_root_node() is None
+
+        a, b = build()
+        a.meld(b, resolve=prefer_self)
+        assert dict(a.items()) == {**b_items, **a_items}
+
+        a, b = build()
+        a.intersection(b, resolve=lambda k, x, y: (x, y))
+        assert dict(a.items()) == {
+            k: (a_items[k], b_items[k]) for k in a_items if k in b_items
+        }
+        assert check_treap_invariants(a.get_root_node()) == len(a)
+
+        a, b = build()
+        a.difference(b)
+        assert dict(a.items()) == {k: v for k, v in a_items.items() if k not in b_items}
+        assert check_treap_invariants(a.get_root_node()) == len(a)
+
+        a, b = build()
+        a.symmetric_difference(b)
+        expected = {k: v for k, v in a_items.items() if k not in b_items}
+        expected.update({k: v for k, v in b_items.items() if k not in a_items})
+        assert dict(a.items()) == expected
+        assert check_treap_invariants(a.get_root_node()) == len(a)
+
+
+def test_batch_operations() -> None:
+    """Test lookup_many/insert_many/remove_many against a dict."""
+
+    t = TreapMap.from_items((i, str(i)) for i in range(0, 100, 3))
+    queries = [50, 3, 4, 99, 3, -1, 51]
+    assert t.lookup_many(queries, default="-") == [
+        str(k) if k % 3 == 0 and 0 <= k < 100 else "-" for k in queries
+    ]
+    assert TreapMap().lookup_many([1, 2]) == [None, None]
+
+    t.insert_many([1, 2, 1, 3], ["a", "b", "c", "d"])
+    assert t.lookup_many([1, 2, 3]) == ["c", "b", "d"]
+    assert t.remove_many([1, 2, 2, 1000]) == 2
+    assert t.lookup_many([1, 2, 3, 6]) == [None, None, "d", "6"]
+    assert check_treap_invariants(t.get_root_node()) == len(t)
+
+
+def test_batch_operations_numpy() -> None:
+    """Test the NumPy fast path for numeric key arrays."""
+
+    np = pytest.importorskip("numpy")
+    t = TreapMap.from_items((i, i * 10) for i in range(100))
+    queries = np.array([5, 200, 5, 99, -3], dtype=np.int64)
+    results = t.lookup_many(queries, default=-1)
+    assert results.tolist() == [50, -1, 50, 990, -1]
+
+    t.insert_many(np.arange(100, 110), range(10))
+    assert t.remove_many(np.arange(0, 50)) == 50
+    assert len(t) == 60
+
+
+class CountingKey:
+    """An int key that counts how often it is compared."""
+
+    comparisons = 0
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+
+    def __lt__(self, other: "CountingKey") -> bool:
+        CountingKey.comparisons += 1
+        return self.k < other.k
+
+    def __eq__(self, other: object) -> bool:
+        CountingKey.comparisons += 1
+        return isinstance(other, CountingKey) and self.k == other.k
+
+    def __hash__(self) -> int:
+        return hash(self.k)
+
+
+def test_finger_insert() -> None:
+    """Test hinted inserts against plain ones, including stale hints."""
+
+    rng = random.Random(17)
+    keys = list(range(0, 60000, 2))
+    # Nearly sorted: each key is at most a few places out of order.
+    for i in range(0, len(keys) - 3, 3):
+        if rng.random() < 0.3:
+            keys[i], keys[i + 2] = keys[i + 2], keys[i]
+
+    plain, hinted = TreapMap(), TreapMap()
+    CountingKey.comparisons = 0
+    for k in keys:
+        plain.insert(CountingKey(k), k)
+    plain_comparisons = CountingKey.comparisons
+
+    CountingKey.comparisons = 0
+    hint = None
+    for k in keys:
+        hint = hinted.insert(CountingKey(k), k, hint=hint)
+    assert CountingKey.comparisons * 2 < plain_comparisons
+    assert [key.k for key in hinted] == sorted(keys)
+    assert check_treap_invariants(hinted.get_root_node()) == len(hinted)
+
+    t = TreapMap.from_items((k, k) for k in range(0, 100, 2))
+    node = t.locate(40)
+    assert node.key == 40 and t.locate(41) is None
+    for k in (41, 3, 99, 40, -5, 60):
+        assert t.insert(k, -k, hint=node).key == k
+    assert t.lookup(40) == -40 and t.lookup(3) == -3
+    assert t.remove(41) == -41
+    stale = t.locate(60)
+    t.remove(60)
+    assert t.insert(61, 0, hint=stale).key == 61
+    assert len(t) == 53
+    assert check_treap_invariants(t.get_root_node()) == len(t)
+
+    # Set operations can drop a node while its key stays in the treap.
+    for seed in range(20):
+        t = TreapMap.from_items(((k, k) for k in range(100)), HashPriority(seed))
+        h = t.insert(50, "a")
+        t.insert_many([50], ["b"])
+        assert t.insert(50, "c", hint=h).key == 50 and t.lookup(50) == "c"
+        h = t.locate(30)
+        t.meld(TreapMap.from_items([(30, "m"), (31, "m")], HashPriority(seed + 1)))
+        t.difference(TreapMap.from_items([(31, None)]))
+        assert t.insert(30, "d", hint=h).key == 30 and t.lookup(30) == "d"
+        h = t.locate(70)
+        t.intersection(TreapMap.from_items((k, k) for k in range(60, 80) if k != 70))
+        t.insert(75, "e", hint=h)
+        assert t.lookup(75) == "e" and list(t) == [k for k in range(60, 80) if k != 70]
+        assert check_treap_invariants(t.get_root_node()) == len(t)
+
+
+def test_single_comparison_search() -> None:
+    """Test that searches for non-native keys compare once per level."""
+
+    t = TreapMap.from_items((CountingKey(k), k) for k in range(0, 2000, 2))
+    height = t.height()
+    for k in range(-1, 2001):
+        CountingKey.comparisons = 0
+        assert t.lookup(CountingKey(k)) == (k if k % 2 == 0 and 0 <= k < 2000 else None)
+        assert CountingKey.comparisons <= height + 1
+        assert (t.locate(CountingKey(k)) is not None) == (k % 2 == 0 and 0 <= k < 2000)
+    for k in range(0, 2000, 4):
+        assert t.insert(CountingKey(k), -k).key.k == k
+        assert t.remove(CountingKey(k + 2)) == k + 2
+    assert t.remove(CountingKey(1)) is None
+    assert [(key.k, value) for key, value in t.items()] == [(k, -k) for k in range(0, 2000, 4)]
+    assert check_treap_invariants(t.get_root_node()) == 500
+
+
+def test_append() -> None:
+    """Test the append fast path for keys above the maximum."""
+
+    t = TreapMap()
+    for k in range(1000):
+        assert t.append(k, str(k)).key == k
+    assert list(t) == list(range(1000))
+    assert check_treap_invariants(t.get_root_node()) == 1000
+    with pytest.raises(ValueError):
+        t.append(999, "x")
+    with pytest.raises(ValueError):
+        t.append(5, "x")
+
+
+def test_navigation() -> None:
+    """Test floor, ceiling, predecessor and successor against a sorted list."""
+
+    rng = random.Random(20)
+    keys = sorted(rng.sample(range(1000), 200))
+    t = TreapMap.from_items((k, k) for k in keys)
+    for probe in list(range(-2, 1002, 7)) + keys[:20]:
+        below = [k for k in keys if k <= probe]
+        above = [k for k in keys if k >= probe]
+        assert t.floor(probe) == (below[-1] if below else None)
+        assert t.ceiling(probe) == (above[0] if above else None)
+        strictly_below = [k for k in keys if k < probe]
+        strictly_above = [k for k in keys if k > probe]
+        assert t.predecessor(probe) == (strictly_below[-1] if strictly_below else None)
+        assert t.successor(probe) == (strictly_above[0] if strictly_above else None)
+    assert TreapMap().floor(3) is None and TreapMap().successor(3) is None
+
+
+def test_peek_and_pop_extremes() -> None:
+    """Test cached min/max through pops interleaved with other updates."""
+
+    rng = random.Random(21)
+    t = TreapMap()
+    assert t.peek_min() is None and t.pop_max() is None
+    expected = {}
+    for step in range(3000):
+        op = rng.random()
+        if op < 0.4:
+            k = rng.randrange(-500, 500)
+            t.insert(k, step)
+            expected[k] = step
+        elif op < 0.55 and expected:
+            k = rng.choice(list(expected))
+            assert t.remove(k) == expected.pop(k)
+        elif op < 0.75:
+            popped = t.pop_min()
+            assert popped == ((min(expected), expected.pop(min(expected))) if expected else None)
+        elif op < 0.95:
+            popped = t.pop_max()
+            assert popped == ((max(expected), expected.pop(max(expected))) if expected else None)
+        elif op < 0.97:
+            other = TreapMap.from_items((rng.randrange(-600, 600), -1) for _ in range(5))
+            expected.update(other.items())
+            t.meld(other, prefer_other)
+        else:
+            left, right = t.split(rng.randrange(-500, 500))
+            left.join(right)
+            t = left
+        assert t.peek_min() == ((min(expected), expected[min(expected)]) if expected else None)
+        assert t.peek_max() == ((max(expected), expected[max(expected)]) if expected else None)
+    assert check_treap_invariants(t.get_root_node()) == len(t) == len(expected)
+
+
+def test_shape_telemetry() -> None:
+    """Test height, sampled depths and the approximate balance factor."""
+
+    class Ascending(PrioritySource):
+        def __call__(self, key):
+            return key
+
+    empty = TreapMap()
+    assert empty.height() == 0 and not empty.depth_histogram()
+    assert empty.balance_factor(approx=True) == 1.0
+
+    t = TreapMap.from_items((k, k) for k in range(10000))
+    height = t.height()
+    histogram = t.depth_histogram(200, random.Random(3))
+    assert sum(histogram.values()) == 200
+    assert 1 <= min(histogram) and max(histogram) <= height
+    assert t.balance_factor() == height / math.log2(10001)
+    assert 1.0 <= t.balance_factor(approx=True) <= t.balance_factor() < 4.0
+
+    # A list-shaped treap is caught without walking its 5000 levels.
+    chain = TreapMap.from_sorted(((i, i) for i in range(5000)), Ascending())
+    assert chain.height() == 5000
+    limit = math.ceil(TreapMap.DEPTH_LIMIT * math.log2(5001))
+    assert max(chain.depth_histogram(10)) <= limit
+    assert chain.balance_factor(approx=True) >= TreapMap.DEPTH_LIMIT
+
+
+def test_async_bulk_operations() -> None:
+    """Test ameld, adifference and aload against their blocking versions."""
+
+    rng = random.Random(24)
+    a_items = [(rng.randrange(5000), i) for i in range(3000)]
+    b_items = [(rng.randrange(5000), -i) for i in range(2000)]
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        beat = asyncio.ensure_future(heartbeat())
+        t = TreapMap()
+        await t.aload(a_items, chunk_size=100, budget=None)
+        assert ticks >= 29
+        expected = dict(a_items)
+        assert list(t.items()) == sorted(expected.items())
+
+        other = TreapMap.from_items(b_items)
+        before = ticks
+        await t.ameld(other, prefer_other, chunk_size=64, budget=None)
+        assert ticks - before >= len(dict(b_items)) // 64
+        expected.update(b_items)
+        assert list(t.items()) == sorted(expected.items()) and len(other) == 0
+
+        await t.adifference(TreapMap.from_items(a_items))
+        assert list(t.items()) == sorted(
+            (k, v) for k, v in expected.items() if k not in dict(a_items)
+        )
+        assert check_treap_invariants(t.get_root_node()) == len(t)
+        beat.cancel()
+
+        # Keys added to other mid-meld, above or below the cursor, are melded.
+        t = TreapMap.from_items((k, k) for k in range(0, 1000, 2))
+        other = TreapMap.from_items((k, -k) for k in range(1, 1000, 2))
+
+        async def add_keys():
+            await asyncio.sleep(0)
+            other.insert(999.5, "above")
+            other.insert(-1, "below")
+
+        await asyncio.gather(t.ameld(other, chunk_size=50, budget=None), add_keys())
+        assert t.lookup(999.5) == "above" and t.lookup(-1) == "below"
+        assert len(other) == 0 and len(t) == 1002
+
+    asyncio.run(run())
+
+
+def test_async_iteration() -> None:
+    """Test async iteration, including updates made between slices."""
+
+    t = TreapMap.from_items((k, str(k)) for k in range(0, 1000, 2))
+
+    async def run():
+        assert [k async for k in t] == list(range(0, 1000, 2))
+        assert [kv async for kv in t.aitems(chunk_size=7, budget=None)] == list(t.items())
+
+        seen = []
+        async for k in t.akeys(chunk_size=10, budget=None):
+            seen.append(k)
+            if k == 100:
+                t.insert(51, "behind")
+                t.insert(501, "ahead")
+                t.remove(600)
+        assert seen == sorted([k for k in range(0, 1000, 2) if k != 600] + [501])
+
+    asyncio.run(run())
@@ -0,0 +1,151 @@
+import os
+import random
+import threading
+
+import pytest
+
+from py_treaps.treap_map import TreapMap
+from py_treaps.wal import INSERT, JOIN, REMOVE, SPLIT, DurableTreapMap, recover, replay
+from tests.test_treaps import check_treap_invariants
+
+
+def test_recovery_after_crash(tmp_path) -> None:
+    """Test that committed changes survive reopening and a torn tail is dropped."""
+
+    rng = random.Random(1)
+    expected = {}
+    wal = DurableTreapMap(str(tmp_path), commit_interval=None)
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if rng.random() < 0.3:
+            assert wal.remove(key) == expected.pop(key, None)
+        else:
+            wal.insert(key, key * 2)
+            expected[key] = key * 2
+    wal.commit()
+    # Uncommitted changes are lost in a crash: simulate one by dropping the
+    # buffer and the file handle without closing.
+    wal.insert(10**6, 0)
+    wal._log.close()
+
+    # A write cut short by the crash leaves a torn record at the end.
+    log = os.path.join(str(tmp_path), "log-00000000.wal")
+    size = os.path.getsize(log)
+    with open(log, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    with DurableTreapMap(str(tmp_path), commit_interval=None) as wal:
+        assert dict(wal.items()) == expected
+        assert os.path.getsize(log) == size
+        wal.insert(-1, "after")
+    with DurableTreapMap(str(tmp_path), commit_interval=None) as wal:
+        assert wal.lookup(-1) == "after" and len(wal) == len(expected) + 1
+
+
+def test_replay_batches_match_sequential() -> None:
+    """Test that batched replay matches applying each operation in turn."""
+
+    rng = random.Random(2)
+    operations, model = [], {}
+    for _ in range(3000):
+        roll = rng.random()
+        if roll < 0.6:
+            operation = (INSERT, rng.randrange(1000), rng.random())
+            model[operation[1]] = operation[2]
+        elif roll < 0.98:
+            operation = (REMOVE, rng.randrange(1000))
+            model.pop(operation[1], None)
+        elif roll < 0.99:
+            operation = (SPLIT, rng.randrange(1000))
+            model = {k: v for k, v in model.items() if k < operation[1]}
+        else:
+            # Join keys above any key inserted so far.
+            start = max(model, default=0) + 1000
+            operation = (JOIN, [(k, -k) for k in range(start, start + rng.randrange(1, 5))])
+            model.update(operation[1])
+        operations.append(operation)
+
+    treap = replay(TreapMap(), operations)
+    assert list(treap.items()) == sorted(model.items())
+    assert check_treap_invariants(treap.get_root_node()) == len(model)
+
+
+def test_split_join_and_compaction(tmp_path) -> None:
+    """Test split/join logging and compaction while another thread writes."""
+
+    directory = str(tmp_path)
+    with DurableTreapMap(directory, commit_interval=0.001, compact_bytes=4096) as wal:
+        for key in range(100):
+            wal.insert(key, key)
+        upper = wal.split(50)
+        assert list(upper) == list(range(50, 100)) and len(wal) == 50
+        with pytest.raises(ValueError):
+            wal.join(TreapMap.from_items([(10, 10)]))
+        wal.join(TreapMap.from_items([(k, -k) for k in range(200, 210)]))
+
+        def write(start):
+            for key in range(start, start + 2000):
+                wal.insert(key, key)
+                if key % 3 == 0:
+                    wal.remove(key)
+
+        writers = [threading.Thread(target=write, args=(start,)) for start in (1000, 5000)]
+        for writer in writers:
+            writer.start()
+        wal.compact()
+        for writer in writers:
+            writer.join()
+        wal.compact(wait=True)
+        expected = list(wal.items())
+
+    names = sorted(os.listdir(directory))
+    assert names[0].startswith("log-") and names[-1].startswith("snapshot-")
+    assert len(names) <= 3
+    with DurableTreapMap(directory, commit_interval=None) as wal:
+        assert list(wal.items()) == expected
+        assert wal.lookup(205) == -205 and 1002 not in wal and 1001 in wal
+
+
+def test_closed_map_rejects_changes(tmp_path) -> None:
+    """Test that changes after close raise instead of being silently lost."""
+
+    wal = DurableTreapMap(str(tmp_path), commit_interval=0.001)
+    wal.insert(1, "one")
+    wal.close()
+    assert wal.closed
+    for operation in (
+        lambda: wal.insert(2, "two"),
+        lambda: wal.remove(1),
+        lambda: wal.split(1),
+        lambda: wal.join(TreapMap.from_items([(5, 5)])),
+        wal.commit,
+        wal.compact,
+    ):
+        with pytest.raises(ValueError, match="closed"):
+            operation()
+    wal.close()
+    assert wal.lookup(1) == "one" and len(wal) == 1
+    with DurableTreapMap(str(tmp_path), commit_interval=None) as reopened:
+        assert list(reopened.items()) == [(1, "one")]
+
+
+def test_corrupt_older_segment_stops_recovery(tmp_path) -> None:
+    """Test that a bad record before the newest segment raises, not skips."""
+
+    directory, other = str(tmp_path / "a"), str(tmp_path / "b")
+    for path, keys in ((directory, range(20)), (other, range(20, 40))):
+        with DurableTreapMap(path, commit_interval=None) as wal:
+            for key in keys:
+                wal.insert(key, key)
+    # Make the second map's log the next segment of the first.
+    first = os.path.join(directory, "log-00000000.wal")
+    second = os.path.join(directory, "log-00000001.wal")
+    os.replace(os.path.join(other, "log-00000000.wal"), second)
+    with open(first, "r+b") as f:
+        f.seek(os.path.getsize(first) // 2)
+        f.write(b"\xff\xff")
+
+    with pytest.raises(ValueError, match="log-00000000"):
+        recover(directory)
+    with pytest.raises(ValueError):
+        DurableTreapMap(directory, commit_interval=None)